@@ -0,0 +1,165 @@
+import functools
+from urllib import parse as urlparse
+
+import aiohttp
+import kopf
+
+from open4k import client
+from open4k import exception
+from open4k import settings
+from open4k import utils
+
+LOG = utils.get_logger(__name__)
+
+SESSION = None
+
+
+def get_session():
+    """Return aiohttp session shared by all async clients.
+
+    Must be called from the running event loop.
+    """
+    global SESSION
+    if SESSION is None or SESSION.closed:
+        SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=settings.OPEN4K_AIOCLIENT_CONNECTIONS
+            ),
+            timeout=aiohttp.ClientTimeout(
+                total=settings.OPEN4K_AIOCLIENT_TIMEOUT
+            ),
+        )
+    return SESSION
+
+
+@kopf.on.cleanup()
+async def close_session(**kwargs):
+    if SESSION is not None:
+        await SESSION.close()
+
+
+@functools.lru_cache()
+def get_operations(service):
+    """Parse os_sdk_light schema into {resource: {operation: Operation}}.
+
+    Operations are grouped by the first path segment the same way
+    bravado does it for the synchronous client.
+    """
+    spec = client.get_schema(service)
+    resources = {}
+    for path, methods in spec["paths"].items():
+        for method, op in methods.items():
+            resource = path.lstrip("/").split("/")[0]
+            params = [(p["in"], p["name"]) for p in op.get("parameters", [])]
+            resources.setdefault(resource, {})[op["operationId"]] = Operation(
+                op["operationId"], method.upper(), path, params
+            )
+    return resources
+
+
+class Operation:
+    def __init__(self, operation_id, method, path, params):
+        self.operation_id = operation_id
+        self.method = method
+        self.path = path
+        self.params = params
+
+    def request(self, kwargs):
+        """Return (path, query, body) for the call arguments.
+
+        Arguments not declared in the schema are sent as query
+        parameters.
+        """
+        path = self.path
+        query = {}
+        body = None
+        kwargs = dict(kwargs)
+        for location, name in self.params:
+            if name not in kwargs:
+                continue
+            value = kwargs.pop(name)
+            if location == "path":
+                path = path.replace(
+                    "{%s}" % name, urlparse.quote(str(value), safe="")
+                )
+            elif location == "body":
+                body = value
+            else:
+                query[name] = value
+        query.update(kwargs)
+        for k, v in query.items():
+            if isinstance(v, bool):
+                query[k] = str(v).lower()
+        return path, query, body
+
+
+class BoundOperation:
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    async def __call__(self, **kwargs):
+        path, query, body = self.operation.request(kwargs)
+        url = self.client.endpoint.rstrip("/") + path
+        return await self.client.request(
+            self.operation.method, url, params=query, json=body
+        )
+
+
+class Resource:
+    def __init__(self, client, name, operations):
+        self.client = client
+        self.name = name
+        self.operations = operations
+
+    def __getattr__(self, name):
+        try:
+            return BoundOperation(self.client, self.operations[name])
+        except KeyError:
+            raise AttributeError(
+                f"Operation {name} not found for resource {self.name}"
+            )
+
+
+class AsyncClient:
+    """aiohttp based client driven by os_sdk_light schemas.
+
+    Mimics os_sdk_light client interface, so generated controllers call
+    ``await c.servers.get_server(server_id=...)``.
+    """
+
+    def __init__(self, service, endpoint, token):
+        spec = client.get_schema(service)
+        self.service = service
+        self.endpoint = endpoint.rstrip("/") + spec["basePath"]
+        self.token = token
+        self.headers = {}
+        version_header = spec["info"].get("x-version-header")
+        if version_header:
+            template = spec["info"].get(
+                "x-version-header-value-template", "%s"
+            )
+            self.headers[version_header] = template % spec["info"]["version"]
+        self.operations = get_operations(service)
+
+    def __getattr__(self, name):
+        try:
+            operations = self.__dict__["operations"][name]
+        except KeyError:
+            raise AttributeError(f"Resource {name} not found")
+        return Resource(self, name, operations)
+
+    async def request(self, method, url, **kwargs):
+        headers = dict(self.headers)
+        headers["X-Auth-Token"] = self.token
+        headers.update(kwargs.pop("headers", {}))
+        async with get_session().request(
+            method, url, headers=headers, **kwargs
+        ) as resp:
+            if resp.status >= 400:
+                raise exception.OpenStackApiError(
+                    resp.status, await resp.text()
+                )
+            if resp.status == 204 or resp.content_length == 0:
+                return None
+            return await resp.json(content_type=None)
@@ -1,3 +1,5 @@
+import concurrent.futures
+import os
 import sys
 import json
 
@@ -6,64 +8,159 @@ from open4k import settings
 from open4k.controllers import RESOURCES
 from open4k import resource as rlib
 
+OPTIONS = [
+    "--checkpoint",
+    "--workers",
+    "--export",
+    "--output",
+    "--shard-index",
+    "--shard-count",
+    "--load",
+]
+
 
 def parse_args(args):
     i = 0
     n = len(args)
     resources = []
     filters = {}
+    options = {}
     while i < n:
         arg = args[i]
+        if arg in OPTIONS:
+            if i == (n - 1):
+                print(f"No option value for {arg}", file=sys.stderr)
+                raise ValueError("Option is not specified")
+            options[arg.lstrip("-")] = args[i + 1]
+            i += 2
+            continue
         if arg.startswith("--filter-"):
             if i == (n - 1):
-                print(f"No option value for {arg}")
+                print(f"No option value for {arg}", file=sys.stderr)
                 raise ValueError("Option is not specified")
             try:
                 data = json.loads(args[i + 1])
                 for k, v in data.items():
                     pass
             except Exception as e:
-                print(f"Cannot parse filter {arg}: {e}")
+                print(f"Cannot parse filter {arg}: {e}", file=sys.stderr)
                 raise
             filters[arg.replace("--filter-", "")] = data
             i += 2
             continue
         resources.append(arg)
         i += 1
-    return (resources, filters)
+    return (resources, filters, options)
+
+
+def load(path):
+    failed = 0
+    with open(path) as f:
+        for data in rlib.read_manifests(f):
+            try:
+                rlib.load(data)
+            except Exception as e:
+                name = data.get("metadata", {}).get("name")
+                print(f"Failed to load {name}: {e}", file=sys.stderr)
+                failed += 1
+    return 1 if failed else 0
 
 
 def main():
-    resources = RESOURCES.keys()
+    resources = []
     filters = {}
+    options = {}
     if len(sys.argv) > 1:
         try:
-            resources, filters = parse_args(sys.argv[1:])
+            resources, filters, options = parse_args(sys.argv[1:])
         except Exception as e:
-            print(f"unable to parse arguments {e}")
+            print(f"unable to parse arguments {e}", file=sys.stderr)
             return 1
     if "-h" in resources:
         print(
             "example usage: import_resources "
             'image --filter-image \'{"name": "in:cirros-0.4.0"}\' '
-            'instance --filter-instance \'{"description": "test-instances"}\''
+            'instance --filter-instance \'{"description": "test-instances"}\' '
+            "--workers 20 --checkpoint /tmp/import.checkpoint\n"
+            "to write manifests instead of creating resources add "
+            "--export yaml|jsonl [--output FILE], load them with "
+            "--load FILE\n"
+            "to import a part of objects add --shard-count N "
+            "[--shard-index I], the index of an Indexed Job pod is used "
+            "by default"
         )
         return 0
 
+    if "load" in options:
+        return load(options["load"])
+
     dry_run = False
     if "--dry-run" in resources:
         resources.remove("--dry-run")
         dry_run = True
+    resources = resources or list(RESOURCES.keys())
 
     unknown = set(resources) - set(RESOURCES.keys())
     if unknown:
-        print(f"Unknown resources {unknown}")
+        print(f"Unknown resources {unknown}", file=sys.stderr)
         return 1
-    for cloud in client.get_clouds(settings.OPEN4K_NAMESPACE)["clouds"]:
-        for resource in resources:
-            rlib.import_resources(
-                cloud, resource, filters.get(resource), dry_run
-            )
+    shard_count = int(options.get("shard-count", 1))
+    shard_index = int(
+        options.get("shard-index", os.environ.get("JOB_COMPLETION_INDEX", 0))
+    )
+    if not 0 <= shard_index < shard_count:
+        print(
+            f"Shard index {shard_index} is out of [0, {shard_count})",
+            file=sys.stderr,
+        )
+        return 1
+
+    output = sys.stdout
+    exporter = None
+    if "export" in options:
+        if "output" in options:
+            output = open(options["output"], "w")
+        try:
+            exporter = rlib.Exporter(output, options["export"])
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+    importer = rlib.Importer(
+        int(options.get("workers", settings.OPEN4K_IMPORT_WORKERS)),
+        checkpoint=rlib.Checkpoint(options.get("checkpoint")),
+        dry_run=dry_run,
+        exporter=exporter,
+        shard_index=shard_index,
+        shard_count=shard_count,
+    )
+    clouds = client.get_clouds(settings.OPEN4K_NAMESPACE)["clouds"]
+    failed = 0
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=settings.OPEN4K_IMPORT_LIST_WORKERS
+    ) as pool:
+        futures = {
+            pool.submit(
+                importer.import_resources,
+                cloud,
+                resource,
+                filters.get(resource),
+            ): (cloud, resource)
+            for cloud in clouds
+            for resource in resources
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                failed += future.result()
+            except Exception as e:
+                print(
+                    f"Failed to import {futures[future]}: {e}",
+                    file=sys.stderr,
+                )
+                failed += 1
+    importer.close()
+    if output is not sys.stdout:
+        output.close()
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
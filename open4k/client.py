@@ -1,26 +1,278 @@
 import base64
+import collections
+import copy
+import functools
+import threading
+import time
+from urllib import parse as urlparse
+
+import kopf
+import os_client_config
 import pykube
 import yaml
 
+from open4k import aioclient
+from open4k import executor
 from open4k import kube
+from open4k import settings
+from open4k import utils
 import os_sdk_light as osl
 
+LOG = utils.get_logger(__name__)
 
-def get_client(namespace, cloud, service):
-    clouds = get_clouds(namespace)
-    client = osl.get_client(
-        cloud=cloud,
-        service=service,
-        schema=osl.schema(f"{service}.yaml"),
-        cloud_config=clouds,
-        config={"use_models": False},
+
+PAGE_PARAMS = [
+    {"in": "query", "name": "limit", "type": "integer", "required": False},
+    {"in": "query", "name": "marker", "type": "string", "required": False},
+]
+
+
+@functools.lru_cache()
+def get_schema(service):
+    """Load os_sdk_light schema of the service.
+
+    Collection GET operations get limit and marker parameters when they
+    are not declared, so all lists can be paginated.
+    """
+    with open(osl.schema(f"{service}.yaml")) as f:
+        spec = yaml.safe_load(f)
+    for path, methods in spec["paths"].items():
+        op = methods.get("get")
+        if op is None or path.endswith("}"):
+            continue
+        params = op.setdefault("parameters", [])
+        names = {p["name"] for p in params}
+        params.extend(p for p in PAGE_PARAMS if p["name"] not in names)
+    return spec
+
+
+def _set_token(client, token):
+    client.swagger_spec.http_client.set_api_key(
+        urlparse.urlsplit(client.endpoint).netloc,
+        token,
+        param_name="x-auth-token",
+        param_in="header",
+    )
+    client.token = token
+
+
+def _build_client(service, endpoint, token):
+    """Build os_sdk_light client for already known endpoint and token.
+
+    Mirrors os_sdk_light.get_client but skips authentication, so
+    the token and the service catalog can be shared between clients.
+    """
+    spec = copy.deepcopy(get_schema(service))
+    url = urlparse.urlsplit(endpoint)
+    client_endpoint = endpoint.rstrip("/") + spec["basePath"]
+    spec["host"] = url.netloc
+    spec["basePath"] = url.path.rstrip("/") + spec["basePath"]
+    spec["schemes"] = [url.scheme]
+
+    http_client = osl.OSLRequestsClient()
+    version_header = spec["info"].get("x-version-header")
+    if version_header:
+        template = spec["info"].get("x-version-header-value-template", "%s")
+        http_client.custom_headers = [
+            (version_header, template % spec["info"]["version"])
+        ]
+    client = osl.OSLSwaggerClient.from_spec(
+        spec, http_client=http_client, config={"use_models": False}
     )
+    client.endpoint = client_endpoint
+    _set_token(client, token)
     return client
 
 
-def get_clouds(namespace):
-    clouds = kube.find(pykube.Secret, "open4k", namespace=namespace)
-    clouds = yaml.safe_load(
-        base64.b64decode(clouds.obj["data"]["clouds.yaml"])
+class CloudSession:
+    """Keystone token and service catalog of a single cloud.
+
+    The token is shared by clients of all services of the cloud and
+    renewed settings.OPEN4K_CLIENT_TOKEN_REFRESH_MARGIN seconds before
+    its expiration, but not before half of its lifetime has passed, so
+    short-lived tokens are not renewed on every call.
+    """
+
+    def __init__(self, namespace, cloud):
+        self.namespace = namespace
+        self.cloud = cloud
+        self.lock = threading.Lock()
+        self.config = None
+        self.session = None
+        self.access = None
+        self.clients = {}
+
+    def expires_soon(self):
+        if self.access is None:
+            return True
+        expires = self.access.expires.timestamp()
+        lifetime = expires - self.access.issued.timestamp()
+        margin = min(settings.OPEN4K_CLIENT_TOKEN_REFRESH_MARGIN, lifetime / 2)
+        return expires - time.time() < margin
+
+    def authenticate(self):
+        if self.session is None:
+            cnf = os_client_config.OpenStackConfig()
+            cnf.cloud_config = get_clouds(self.namespace)
+            self.config = cnf.get_one(self.cloud)
+            self.session = self.config.get_session()
+        else:
+            self.session.auth.invalidate()
+        self.access = self.session.auth.get_access(self.session)
+        LOG.info(
+            f"Got token for cloud {self.cloud}, "
+            f"expires at {self.access.expires}"
+        )
+
+    def endpoint(self, service):
+        interface = self.config.config.get("interface", "public")
+        endpoints = self.access.service_catalog.get_endpoints()
+        try:
+            return [
+                e["url"]
+                for e in endpoints[service]
+                if e["interface"] == interface
+            ][0]
+        except (KeyError, IndexError, TypeError) as e:
+            raise osl.exceptions.CannotConnectToCloud(
+                f"Failed to find {service} endpoint in cloud {self.cloud}: {e}"
+            )
+
+    def get_client(self, service, aio=False):
+        with self.lock:
+            token_expired = self.expires_soon()
+            if token_expired:
+                self.authenticate()
+            token = self.access.auth_token
+            if token_expired:
+                for (_, is_aio), client in self.clients.items():
+                    if is_aio:
+                        client.token = token
+                    else:
+                        _set_token(client, token)
+            client = self.clients.get((service, aio))
+            if client is None:
+                build = aioclient.AsyncClient if aio else _build_client
+                client = build(service, self.endpoint(service), token)
+                self.clients[(service, aio)] = client
+            return client
+
+    def drop_client(self, service, aio=False):
+        with self.lock:
+            self.clients.pop((service, aio), None)
+            return not self.clients
+
+
+class ClientPool:
+    """Process-wide pool of OpenStack clients.
+
+    Clients are keyed by (namespace, cloud, service) and whether the
+    client is the asynchronous one. The least recently
+    used clients are evicted when the pool grows over its size or when
+    they were not used for idle_timeout seconds.
+    """
+
+    def __init__(self, size, idle_timeout):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.used = collections.OrderedDict()
+
+    def get(self, namespace, cloud, service, aio=False):
+        key = (namespace, cloud, service, aio)
+        with self.lock:
+            session = self.sessions.get((namespace, cloud))
+            if session is None:
+                session = CloudSession(namespace, cloud)
+                self.sessions[(namespace, cloud)] = session
+            self.used[key] = time.monotonic()
+            self.used.move_to_end(key)
+            self._evict()
+        return session.get_client(service, aio)
+
+    def _evict(self):
+        now = time.monotonic()
+        while self.used:
+            key, last_used = next(iter(self.used.items()))
+            if (
+                len(self.used) <= self.size
+                and now - last_used < self.idle_timeout
+            ):
+                break
+            self.used.pop(key)
+            namespace, cloud, service, aio = key
+            session = self.sessions.get((namespace, cloud))
+            if session and session.drop_client(service, aio):
+                self.sessions.pop((namespace, cloud))
+            LOG.debug(f"Evicted client {key} from the pool")
+
+    def invalidate(self, namespace, cloud=None):
+        """Drop clients of the cloud or of all clouds in the namespace."""
+
+        def match(key):
+            return key[0] == namespace and cloud in (None, key[1])
+
+        with self.lock:
+            for key in [k for k in self.used if match(k)]:
+                self.used.pop(key)
+            for key in [k for k in self.sessions if match(k)]:
+                self.sessions.pop(key)
+        LOG.info(f"Invalidated clients for {namespace}/{cloud or '*'}")
+
+
+# Parsed clouds.yaml from the open4k secret by namespace, kept up to date
+# by clouds_secret_handler.
+CLOUDS = {}
+CLOUDS_LOCK = threading.Lock()
+
+POOL = ClientPool(
+    settings.OPEN4K_CLIENT_POOL_SIZE, settings.OPEN4K_CLIENT_POOL_IDLE_TIMEOUT
+)
+
+
+def get_client(namespace, cloud, service):
+    return POOL.get(namespace, cloud, service)
+
+
+async def get_async_client(namespace, cloud, service):
+    """Return pooled aioclient.AsyncClient for the cloud service.
+
+    Authentication, when needed, runs in the executor of the cloud.
+    """
+    return await executor.run(
+        POOL.get, namespace, cloud, service, True, cloud=cloud
     )
+
+
+def get_clouds(namespace):
+    clouds = CLOUDS.get(namespace)
+    if clouds is None:
+        secret = kube.find(pykube.Secret, "open4k", namespace=namespace)
+        clouds = update_clouds(namespace, secret.obj)
     return clouds
+
+
+def update_clouds(namespace, secret):
+    """Cache clouds config and invalidate clients of changed clouds."""
+    clouds = yaml.safe_load(base64.b64decode(secret["data"]["clouds.yaml"]))
+    with CLOUDS_LOCK:
+        old = CLOUDS.get(namespace)
+        CLOUDS[namespace] = clouds
+    if old is not None:
+        old, new = old.get("clouds", {}), clouds.get("clouds", {})
+        for cloud in set(old) | set(new):
+            if old.get(cloud) != new.get(cloud):
+                POOL.invalidate(namespace, cloud)
+    return clouds
+
+
+@kopf.on.event("", "v1", "secrets", when=lambda name, **_: name == "open4k")
+async def clouds_secret_handler(type, body, namespace, **kwargs):
+    LOG.info(f"Got clouds secret event {type} in {namespace}")
+    if type == "DELETED":
+        with CLOUDS_LOCK:
+            CLOUDS.pop(namespace, None)
+        POOL.invalidate(namespace)
+        return
+    update_clouds(namespace, body)
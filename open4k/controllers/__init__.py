@@ -1,3 +1,6 @@
+# NOTE: imported to register the sync startup and cleanup handlers.
+from open4k import sync  # noqa: F401
+
 from . import flavor
 
 from . import image
@@ -11,3 +11,20 @@ class OsDplValidationFailed(OpenStackControllerException):
         super().__init__()
         self.message = message
         self.code = code
+
+
+class OpenStackApiError(OpenStackControllerException):
+    """OpenStack API returned an error response"""
+
+    def __init__(self, status_code, message=""):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+class ImageDownloadError(OpenStackControllerException):
+    """Image source cannot be downloaded the requested way"""
+
+
+class ImageImportError(OpenStackControllerException):
+    """Glance failed to import an image"""
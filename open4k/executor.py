@@ -0,0 +1,64 @@
+import asyncio
+import concurrent.futures
+import functools
+import threading
+
+import kopf
+
+from open4k import settings
+from open4k import utils
+
+LOG = utils.get_logger(__name__)
+
+# Thread pools by cloud name, None is the pool for kubernetes API calls.
+EXECUTORS = {}
+LOCK = threading.Lock()
+
+
+def pool_size(cloud):
+    if cloud is None:
+        return settings.OPEN4K_EXECUTOR_KUBE_WORKERS
+    return settings.OPEN4K_EXECUTOR_CLOUD_WORKERS.get(
+        cloud, settings.OPEN4K_EXECUTOR_WORKERS
+    )
+
+
+def get_executor(cloud=None):
+    with LOCK:
+        executor = EXECUTORS.get(cloud)
+        if executor is None:
+            prefix = f"open4k-{cloud}" if cloud else "open4k-kube"
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=pool_size(cloud), thread_name_prefix=prefix
+            )
+            EXECUTORS[cloud] = executor
+        return executor
+
+
+async def run(func, *args, cloud=None, timeout=None, **kwargs):
+    """Run blocking func in the thread pool of the cloud.
+
+    Calls to kubernetes API use the pool of cloud None. When timeout
+    (settings.OPEN4K_EXECUTOR_TIMEOUT by default) expires or the caller
+    is cancelled, a call still waiting in the queue is dropped, while a
+    running one is left to finish in its thread.
+    """
+    loop = asyncio.get_event_loop()
+    future = loop.run_in_executor(
+        get_executor(cloud), functools.partial(func, *args, **kwargs)
+    )
+    if timeout is None:
+        timeout = settings.OPEN4K_EXECUTOR_TIMEOUT
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        LOG.error(f"Call {func} in {cloud or 'kube'} pool timed out")
+        raise
+
+
+@kopf.on.cleanup()
+async def shutdown(**kwargs):
+    with LOCK:
+        for executor in EXECUTORS.values():
+            executor.shutdown(wait=False)
+        EXECUTORS.clear()
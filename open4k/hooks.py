@@ -1,58 +1,86 @@
 import asyncio
-import subprocess
 
+from open4k import executor
+from open4k import images
+from open4k import poller
+from open4k import settings
 from open4k import utils
 
 LOG = utils.get_logger(__name__)
 
 
+def exists(resource, hook_name):
+    return utils.get_in(HOOKS, [resource, hook_name]) is not None
+
+
 async def call(resource, hook_name, *args):
+    """Run the hook, it returns status fields to update or None."""
     func = utils.get_in(HOOKS, [resource, hook_name])
     if func:
         return await func(*args)
 
 
 async def wait_instance_ready(c, klass, obj, os_obj):
-    obj.reload()
-    while True:
-        os_obj = klass.get_os_obj(c, obj.obj["status"]["object"]["id"])
-        if os_obj["status"] == "ACTIVE":
-            obj.patch(
-                {"status": {"object": os_obj}},
-                subresource="status",
-            )
-            break
-        asyncio.sleep(1)
+    cloud = obj.obj["spec"]["cloud"]
+    os_obj = await poller.wait_ready(
+        settings.OPEN4K_NAMESPACE, cloud, os_obj["id"]
+    )
+    if os_obj["status"] != "ACTIVE":
+        LOG.error(f"Instance {obj.name} is in {os_obj['status']} state")
+        return {"object": os_obj}
 
     from open4k import resource as rlib
 
-    rlib.import_resources(
-        obj.obj["spec"]["cloud"], "port", {"device_id": os_obj["id"]}
+    await executor.run(
+        rlib.import_resources,
+        cloud,
+        "port",
+        {"device_id": os_obj["id"]},
+        cloud=cloud,
     )
-    return os_obj
+    return {"object": os_obj}
 
 
-async def upload_image(c, klass, obj, os_obj):
+async def _fill_image(c, obj, image_id):
+    """Put spec.url data into the image.
+
+    Returns an active image of the cloud with the same content instead,
+    if there is one.
+    """
+    cloud = obj.obj["spec"]["cloud"]
     url = obj.obj["spec"]["url"]
-    image_id = obj.obj["status"]["object"]["id"]
-    cmd = f"wget {url} -O /tmp/{image_id}"
-    cmd = cmd.split()
-    subprocess.check_call(cmd)
-
-    url = c.endpoint.rstrip("/") + f"/images/{image_id}/file"
-    cmd = (
-        f"curl -i -g -X PUT -H X-Auth-Token:{c.token} "
-        f"-H Content-Type:application/octet-stream "
-        f"--upload-file /tmp/{image_id} "
-        f"{url}"
-    )
-    cmd = cmd.split()
-    subprocess.check_call(cmd)
-    os_obj = klass.get_os_obj(c, obj.obj["status"]["object"]["id"])
-    obj.patch(
-        {"status": {"object": os_obj}},
-        subresource="status",
-    )
+    checksum = obj.obj["spec"].get("checksum")
+    if obj.obj["spec"].get("importMethod") == "web-download":
+        if "web-download" in await images.import_methods(c):
+            if checksum:
+                existing = await images.find_image(
+                    c, *images.parse_checksum(checksum), exclude=image_id
+                )
+                if existing:
+                    return existing
+            LOG.info(f"Importing {url} into image {image_id} by Glance")
+            await asyncio.wait_for(
+                images.web_download(c, url, image_id),
+                settings.OPEN4K_IMAGE_TRANSFER_TIMEOUT,
+            )
+            return
+        LOG.warning(f"Cloud {cloud} does not support web-download")
+    return await images.transfer(c, url, image_id, cloud, checksum)
+
+
+async def upload_image(c, klass, obj, os_obj):
+    cloud = obj.obj["spec"]["cloud"]
+    image_id = os_obj["id"]
+    existing = await _fill_image(c, obj, image_id)
+    if existing:
+        LOG.info(
+            f"Image {existing['id']} in {cloud} has the same content, "
+            f"linking {obj.name} to it"
+        )
+        await klass.delete_os_obj(c, image_id)
+        return {"object": existing, "linked": True}
+
+    return {"object": await klass.get_os_obj(c, image_id)}
 
 
 HOOKS = {
@@ -0,0 +1,563 @@
+import asyncio
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import aiohttp
+
+from open4k import aioclient
+from open4k import exception
+from open4k import executor
+from open4k import settings
+from open4k import utils
+
+LOG = utils.get_logger(__name__)
+
+
+def transfer_timeout():
+    return aiohttp.ClientTimeout(total=settings.OPEN4K_IMAGE_TRANSFER_TIMEOUT)
+
+
+class Meter:
+    """Counts bytes passing through a chunk stream."""
+
+    def __init__(self, cloud):
+        self.cloud = cloud
+        self.size = 0
+        self.started = time.monotonic()
+
+    async def wrap(self, chunks):
+        async for chunk in chunks:
+            self.size += len(chunk)
+            yield chunk
+
+    def report(self, image_id):
+        elapsed = max(time.monotonic() - self.started, 0.001)
+        throughput = self.size / elapsed
+        settings.METRICS["image_transfer_bytes"].labels(self.cloud).inc(
+            self.size
+        )
+        settings.METRICS["image_transfer_throughput"].labels(self.cloud).set(
+            throughput
+        )
+        LOG.info(
+            f"Uploaded {self.size} bytes of image {image_id} to {self.cloud} "
+            f"in {elapsed:.1f}s ({throughput / 2 ** 20:.1f} MiB/s)"
+        )
+
+
+async def upload(c, image_id, chunks):
+    """Upload image data from async iterable of chunks to Glance.
+
+    The data is sent with chunked transfer encoding, so only a few
+    chunks are held in memory and a slow Glance slows the source down.
+    """
+    url = c.endpoint.rstrip("/") + f"/images/{image_id}/file"
+    await c.request(
+        "PUT",
+        url,
+        data=chunks,
+        headers={"Content-Type": "application/octet-stream"},
+        timeout=transfer_timeout(),
+    )
+
+
+async def read_file(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = await executor.run(
+                f.read, settings.OPEN4K_IMAGE_CHUNK_SIZE
+            )
+            if not chunk:
+                return
+            yield chunk
+
+
+def new_hashes():
+    """Return hashes computed over downloaded images.
+
+    sha256 keys the image cache, settings.OPEN4K_IMAGE_HASH_ALGO is
+    compared to os_hash_value of images in clouds.
+    """
+    return {
+        algo: hashlib.new(algo)
+        for algo in {"sha256", settings.OPEN4K_IMAGE_HASH_ALGO}
+    }
+
+
+def new_hash(algo):
+    try:
+        return hashlib.new(algo)
+    except ValueError:
+        raise exception.ImageDownloadError(
+            f"Unsupported checksum algorithm {algo}"
+        )
+
+
+class Verifier:
+    """Checks a chunk stream against "algo:value" checksum.
+
+    The stream fails after its last chunk on a mismatch, so an upload
+    reading it is not completed.
+    """
+
+    def __init__(self, url, checksum):
+        self.url = url
+        self.algo, self.value = parse_checksum(checksum)
+        self.hash = new_hash(self.algo)
+        self.finished = False
+
+    async def wrap(self, chunks):
+        async for chunk in chunks:
+            await executor.run(self.hash.update, chunk)
+            yield chunk
+        self.finished = True
+        self.check()
+
+    def check(self):
+        actual = self.hash.hexdigest()
+        if actual != self.value:
+            raise exception.ImageDownloadError(
+                f"{self.algo} of {self.url} is {actual}, expected {self.value}"
+            )
+
+
+def _write(f, hashes, chunk):
+    f.write(chunk)
+    for h in hashes.values():
+        h.update(chunk)
+
+
+def _hash_file(path, algos=None):
+    if algos is None:
+        hashes = new_hashes()
+    else:
+        hashes = {algo: new_hash(algo) for algo in algos}
+    with open(path, "rb") as f:
+        for chunk in iter(
+            lambda: f.read(settings.OPEN4K_IMAGE_CHUNK_SIZE), b""
+        ):
+            for h in hashes.values():
+                h.update(chunk)
+    return {algo: h.hexdigest() for algo, h in hashes.items()}
+
+
+async def probe(url):
+    """Return size of url content if it can be downloaded by ranges."""
+    try:
+        async with aioclient.get_session().head(
+            url, allow_redirects=True
+        ) as resp:
+            if resp.status != 200:
+                return None
+            if resp.headers.get("Accept-Ranges", "").lower() != "bytes":
+                return None
+            return resp.content_length
+    except aiohttp.ClientError as e:
+        LOG.warning(f"Failed to probe {url}: {e}")
+        return None
+
+
+async def download_range(url, fd, start, end, writes):
+    """Download bytes start-end of url into fd.
+
+    Writes to fd run in executor threads and are added to the writes
+    set until they return. They are not interrupted when the download
+    is cancelled, so fd must be kept open until writes is empty.
+    """
+    loop = asyncio.get_event_loop()
+    headers = {"Range": f"bytes={start}-{end}"}
+    async with aioclient.get_session().get(
+        url, headers=headers, timeout=transfer_timeout()
+    ) as resp:
+        if resp.status != 206:
+            raise exception.ImageDownloadError(
+                f"Got {resp.status} for range {start}-{end} of {url}"
+            )
+        offset = start
+        chunks = resp.content.iter_chunked(settings.OPEN4K_IMAGE_CHUNK_SIZE)
+        async for chunk in chunks:
+            if offset + len(chunk) > end + 1:
+                raise exception.ImageDownloadError(
+                    f"Range {start}-{end} of {url} is too long"
+                )
+            write = loop.run_in_executor(
+                executor.get_executor(), os.pwrite, fd, chunk, offset
+            )
+            writes.add(write)
+            write.add_done_callback(writes.discard)
+            await asyncio.shield(write)
+            offset += len(chunk)
+    if offset != end + 1:
+        raise exception.ImageDownloadError(
+            f"Range {start}-{end} of {url} is incomplete, got {offset - start}"
+        )
+
+
+async def download_ranges(url, path, size, streams):
+    """Download url of known size by streams concurrent ranges."""
+    part = -(-size // streams)
+    writes = set()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, size)
+        tasks = [
+            asyncio.ensure_future(
+                download_range(
+                    url, fd, start, min(start + part, size) - 1, writes
+                )
+            )
+            for start in range(0, size, part)
+        ]
+        done, pending = await asyncio.wait(
+            tasks, return_when=asyncio.FIRST_EXCEPTION
+        )
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        for task in done:
+            task.result()
+    finally:
+        # NOTE: writes of cancelled ranges may still be running in their
+        # threads, closing fd under them could let another file reuse it.
+        if writes:
+            await asyncio.wait(set(writes))
+        os.close(fd)
+    return await executor.run(_hash_file, path), size
+
+
+async def download_stream(url, path):
+    hashes = new_hashes()
+    size = 0
+    async with aioclient.get_session().get(
+        url, timeout=transfer_timeout()
+    ) as resp:
+        resp.raise_for_status()
+        with open(path, "wb") as f:
+            chunks = resp.content.iter_chunked(
+                settings.OPEN4K_IMAGE_CHUNK_SIZE
+            )
+            async for chunk in chunks:
+                await executor.run(_write, f, hashes, chunk)
+                size += len(chunk)
+    return {algo: h.hexdigest() for algo, h in hashes.items()}, size
+
+
+async def download(url, path):
+    """Download url into path, return ({algo: hash}, size) of the content.
+
+    Large sources supporting byte ranges are fetched by
+    settings.OPEN4K_IMAGE_DOWNLOAD_STREAMS concurrent requests, others
+    with a single one.
+    """
+    streams = settings.OPEN4K_IMAGE_DOWNLOAD_STREAMS
+    if streams > 1:
+        size = await probe(url)
+        if size and size >= settings.OPEN4K_IMAGE_RANGE_MIN_SIZE:
+            try:
+                return await download_ranges(url, path, size, streams)
+            except exception.ImageDownloadError as e:
+                LOG.warning(f"Falling back to single stream download: {e}")
+    return await download_stream(url, path)
+
+
+VALIDATORS = {"etag": "ETag", "modified": "Last-Modified"}
+CONDITIONS = {"etag": "If-None-Match", "modified": "If-Modified-Since"}
+
+
+async def validators(url, known=None):
+    """Return ETag and Last-Modified of url content.
+
+    With known validators the request is conditional and they are
+    returned back if the content is not modified.
+    """
+    headers = {CONDITIONS[k]: v for k, v in (known or {}).items()}
+    async with aioclient.get_session().head(
+        url, headers=headers, allow_redirects=True
+    ) as resp:
+        if resp.status == 304:
+            return known
+        resp.raise_for_status()
+        return {
+            k: resp.headers[h]
+            for k, h in VALIDATORS.items()
+            if h in resp.headers
+        }
+
+
+class ImageCache:
+    """Size bounded on-disk cache of image sources.
+
+    Content is stored under its sha256 digest and looked up by url.
+    Entries are revalidated with the url ETag and Last-Modified headers
+    and downloaded again when the content changed. Concurrent requests
+    of the same url share a single download. Least
+    recently used content not being read is evicted once the cache grows
+    over size bytes.
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.readers = collections.Counter()
+        self.downloads = {}
+        os.makedirs(os.path.join(path, "data"), exist_ok=True)
+        os.makedirs(os.path.join(path, "tmp"), exist_ok=True)
+        for name in os.listdir(os.path.join(path, "tmp")):
+            os.remove(os.path.join(path, "tmp", name))
+        self.index = self._load()
+
+    def data_path(self, digest):
+        return os.path.join(self.path, "data", digest)
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.path, "index.json")) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index = {
+            url: entry
+            for url, entry in index.items()
+            if os.path.exists(self.data_path(entry["digest"]))
+        }
+        digests = {entry["digest"] for entry in index.values()}
+        for name in os.listdir(os.path.join(self.path, "data")):
+            if name not in digests:
+                os.remove(self.data_path(name))
+        return index
+
+    def _save(self):
+        tmp = os.path.join(self.path, "index.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, os.path.join(self.path, "index.json"))
+
+    @contextlib.asynccontextmanager
+    async def open(self, url):
+        """Yield (path, entry) of cached url content, download if needed."""
+        entry = await self.get(url)
+        digest = entry["digest"]
+        self.readers[digest] += 1
+        try:
+            yield self.data_path(digest), entry
+        finally:
+            self.readers[digest] -= 1
+            if not self.readers[digest]:
+                del self.readers[digest]
+
+    async def get(self, url):
+        entry = self.index.get(url)
+        if entry and os.path.exists(self.data_path(entry["digest"])):
+            if await self._is_fresh(url, entry):
+                entry["used"] = time.time()
+                return entry
+            LOG.info(f"Source {url} changed, downloading it again")
+        future = self.downloads.get(url)
+        if future is None:
+            future = asyncio.ensure_future(self._download(url))
+            self.downloads[url] = future
+            future.add_done_callback(lambda f: self.downloads.pop(url, None))
+        return await asyncio.shield(future)
+
+    async def _is_fresh(self, url, entry):
+        now = time.time()
+        interval = settings.OPEN4K_IMAGE_CACHE_REVALIDATE_INTERVAL
+        if now - entry.get("checked", entry["used"]) < interval:
+            return True
+        known = entry.get("validators")
+        if not known:
+            return False
+        try:
+            current = await validators(url, known)
+        except aiohttp.ClientError as e:
+            LOG.warning(f"Failed to revalidate {url}, using cache: {e}")
+            return True
+        entry["checked"] = now
+        return current == known
+
+    async def _download(self, url):
+        tmp = os.path.join(self.path, "tmp", uuid.uuid4().hex)
+        try:
+            try:
+                known = await validators(url)
+            except aiohttp.ClientError as e:
+                LOG.warning(f"Failed to get validators of {url}: {e}")
+                known = {}
+            checked = time.time()
+            hashes, size = await download(url, tmp)
+            digest = hashes["sha256"]
+            os.replace(tmp, self.data_path(digest))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        LOG.info(f"Cached {size} bytes of {url} as {digest}")
+        entry = {
+            "digest": digest,
+            "hashes": hashes,
+            "size": size,
+            "used": time.time(),
+            "checked": checked,
+            "validators": known,
+        }
+        old = self.index.get(url)
+        self.index[url] = entry
+        if old:
+            self._remove_unused(old["digest"])
+        self._evict(keep=url)
+        self._save()
+        return entry
+
+    def _evict(self, keep=None):
+        sizes = {e["digest"]: e["size"] for e in self.index.values()}
+        total = sum(sizes.values())
+        lru = sorted(self.index.items(), key=lambda i: i[1]["used"])
+        for url, entry in lru:
+            if total <= self.size:
+                break
+            digest = entry["digest"]
+            if url == keep or self.readers.get(digest):
+                continue
+            del self.index[url]
+            if self._remove_unused(digest):
+                total -= entry["size"]
+                LOG.info(f"Evicted {digest} of {url} from image cache")
+
+    def _remove_unused(self, digest):
+        """Remove content no entry refers to, return whether it is removed.
+
+        Content being read is kept until the next start.
+        """
+        if self.readers.get(digest):
+            return False
+        if any(e["digest"] == digest for e in self.index.values()):
+            return False
+        if os.path.exists(self.data_path(digest)):
+            os.remove(self.data_path(digest))
+        return True
+
+
+async def import_methods(c):
+    """Return image import methods the cloud supports."""
+    info = await c.request("GET", c.endpoint.rstrip("/") + "/info/import")
+    return utils.get_in(info, ["import-methods", "value"], [])
+
+
+async def web_download(c, url, image_id):
+    """Make Glance import the image from url and wait until it is active."""
+    await c.request(
+        "POST",
+        c.endpoint.rstrip("/") + f"/images/{image_id}/import",
+        json={"method": {"name": "web-download", "uri": url}},
+    )
+    while True:
+        image = await c.images.get_image(image_id=image_id)
+        if image["status"] == "active":
+            return image
+        if image["status"] in ("killed", "deleted") or image.get(
+            "os_glance_failed_import"
+        ):
+            raise exception.ImageImportError(
+                f"Import of {url} into image {image_id} failed, "
+                f"image status is {image['status']}"
+            )
+        await asyncio.sleep(settings.OPEN4K_IMAGE_IMPORT_POLL_INTERVAL)
+
+
+def parse_checksum(checksum):
+    """Split "algo:value" checksum, sha512 is assumed without algo."""
+    algo, _, value = checksum.rpartition(":")
+    return (algo or "sha512").lower(), value.lower()
+
+
+async def find_image(c, algo, value, exclude=None):
+    """Return an active image of the cloud with the given content hash."""
+    if algo == "md5":
+        filters = {"checksum": value}
+    else:
+        filters = {"os_hash_value": value}
+    for image in (await c.images.list(**filters))["images"]:
+        if image["id"] == exclude or image["status"] != "active":
+            continue
+        if algo == "md5" or image.get("os_hash_algo") == algo:
+            return image
+
+
+CACHE = None
+
+
+def get_cache():
+    """Return the image cache or None when it is not configured."""
+    global CACHE
+    if CACHE is None and settings.OPEN4K_IMAGE_CACHE_DIR:
+        CACHE = ImageCache(
+            settings.OPEN4K_IMAGE_CACHE_DIR, settings.OPEN4K_IMAGE_CACHE_SIZE
+        )
+    return CACHE
+
+
+async def transfer(c, url, image_id, cloud, checksum=None):
+    """Upload image from url to Glance.
+
+    When the cloud already has an active image with checksum or, with
+    the image cache, with the same hash as the cached content, that
+    image is returned instead of uploading. The content is checked
+    against checksum and the upload fails on a mismatch.
+
+    With the image cache configured the source is downloaded once and
+    uploads of the same url to many clouds read the cached file in
+    parallel. Otherwise the source is streamed to Glance without a
+    temporary file.
+    """
+    if checksum:
+        existing = await find_image(
+            c, *parse_checksum(checksum), exclude=image_id
+        )
+        if existing:
+            return existing
+    meter = Meter(cloud)
+    cache = get_cache()
+    if cache is not None:
+        async with cache.open(url) as (path, entry):
+            hashes = entry.setdefault("hashes", {})
+            if checksum:
+                algo, value = parse_checksum(checksum)
+                if algo not in hashes:
+                    computed = await executor.run(_hash_file, path, [algo])
+                    hashes[algo] = computed[algo]
+                if hashes[algo] != value:
+                    raise exception.ImageDownloadError(
+                        f"{algo} of {url} is {hashes[algo]}, expected {value}"
+                    )
+            algo = settings.OPEN4K_IMAGE_HASH_ALGO
+            if algo in hashes:
+                existing = await find_image(
+                    c, algo, hashes[algo], exclude=image_id
+                )
+                if existing:
+                    return existing
+            await upload(c, image_id, meter.wrap(read_file(path)))
+    else:
+        verifier = Verifier(url, checksum) if checksum else None
+        async with aioclient.get_session().get(
+            url, timeout=transfer_timeout()
+        ) as resp:
+            resp.raise_for_status()
+            chunks = meter.wrap(
+                resp.content.iter_chunked(settings.OPEN4K_IMAGE_CHUNK_SIZE)
+            )
+            if verifier is not None:
+                chunks = verifier.wrap(chunks)
+            try:
+                await upload(c, image_id, chunks)
+            finally:
+                # NOTE: report the mismatch rather than the upload error
+                # it caused.
+                if verifier is not None and verifier.finished:
+                    verifier.check()
+    meter.report(image_id)
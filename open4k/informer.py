@@ -0,0 +1,184 @@
+import copy
+import threading
+from urllib import parse as urlparse
+
+import kopf
+
+from open4k import executor
+from open4k import kube
+from open4k import settings
+from open4k import utils
+
+LOG = utils.get_logger(__name__)
+
+
+class Informer:
+    """Cache of open4k custom resources fed by watch events.
+
+    Objects are indexed by (kind, namespace, name), by (kind, spec.cloud)
+    and by (kind, spec.cloud, status.object.id). A kind is considered
+    synced after its initial list, afterwards a miss means the object
+    does not exist. Objects changed or deleted by events while the list
+    is in flight are not overwritten by the listed bodies.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.clouds = {}
+        self.ids = {}
+        self.synced = set()
+        self.listing = {}
+
+    @staticmethod
+    def _key(body):
+        meta = body["metadata"]
+        return body["kind"], meta.get("namespace"), meta["name"]
+
+    @staticmethod
+    def _cloud(body):
+        return body.get("spec", {}).get("cloud")
+
+    @staticmethod
+    def _object_id(body):
+        return utils.get_in(body, ["status", "object", "id"])
+
+    def _unindex(self, key):
+        body = self.objects.pop(key, None)
+        if body is None:
+            return
+        kind, cloud = key[0], self._cloud(body)
+        self.clouds.get((kind, cloud), set()).discard(key)
+        os_id = self._object_id(body)
+        if self.ids.get((kind, cloud, os_id)) == key:
+            del self.ids[(kind, cloud, os_id)]
+
+    def _index(self, key, body):
+        kind, cloud = key[0], self._cloud(body)
+        self.objects[key] = body
+        self.clouds.setdefault((kind, cloud), set()).add(key)
+        os_id = self._object_id(body)
+        if os_id:
+            self.ids[(kind, cloud, os_id)] = key
+
+    def _touch(self, key):
+        if key[0] in self.listing:
+            self.listing[key[0]].add(key)
+
+    def add(self, body):
+        body = copy.deepcopy(dict(body))
+        key = self._key(body)
+        with self.lock:
+            self._touch(key)
+            self._unindex(key)
+            self._index(key, body)
+
+    def remove(self, body):
+        key = self._key(body)
+        with self.lock:
+            self._touch(key)
+            self._unindex(key)
+
+    def handle(self, event):
+        if event["type"] == "DELETED":
+            self.remove(event["object"])
+        else:
+            self.add(event["object"])
+
+    def begin(self, kind):
+        """Start recording objects of kind changed by events until fill."""
+        with self.lock:
+            self.listing[kind] = set()
+
+    def fill(self, kind, bodies):
+        """Add listed objects unless watch events changed them since begin."""
+        with self.lock:
+            changed = self.listing.pop(kind, set())
+            for body in bodies:
+                key = self._key(body)
+                if key not in self.objects and key not in changed:
+                    self._index(key, body)
+            self.synced.add(kind)
+
+    def get(self, kind, name, namespace):
+        return self.objects.get((kind, namespace, name))
+
+    def by_cloud(self, kind, cloud):
+        with self.lock:
+            keys = list(self.clouds.get((kind, cloud), ()))
+        return [self.objects[k] for k in keys if k in self.objects]
+
+    def by_object_id(self, kind, cloud, os_id):
+        key = self.ids.get((kind, cloud, os_id))
+        if key:
+            return self.objects.get(key)
+
+
+CACHE = Informer()
+
+
+def get_cached(obj):
+    """Return the cached body of obj or None if it is not cached."""
+    return CACHE.get(obj.kind, obj.name, obj.namespace)
+
+
+async def find(klass, name, namespace=None):
+    """Return klass object from the cache, fall back to kube.find."""
+    body = CACHE.get(klass.kind, name, namespace)
+    if body is not None:
+        return klass(kube.api, copy.deepcopy(body))
+    return await executor.run(kube.find, klass, name, namespace=namespace)
+
+
+def find_by_object_id(klass, cloud, os_id):
+    body = CACHE.by_object_id(klass.kind, cloud, os_id)
+    if body is not None:
+        return klass(kube.api, copy.deepcopy(body))
+
+
+def list_objects(klass):
+    """List klass objects of the operator namespace by pages.
+
+    The operator watches this namespace only, objects of other
+    namespaces would never be updated in the cache.
+    """
+    params = {"limit": settings.OPEN4K_LIST_PAGE_SIZE}
+    bodies = []
+    while True:
+        resp = kube.api.get(
+            url=f"{klass.endpoint}?{urlparse.urlencode(params)}",
+            version=klass.version,
+            namespace=settings.OPEN4K_NAMESPACE,
+        )
+        kube.api.raise_for_status(resp)
+        data = resp.json()
+        for body in data.get("items") or []:
+            body.setdefault("kind", klass.kind)
+            bodies.append(body)
+        params["continue"] = data.get("metadata", {}).get("continue")
+        if not params["continue"]:
+            return bodies
+
+
+def load(klass):
+    """Fill the cache with klass objects listed from the API.
+
+    Returns the number of listed objects.
+    """
+    CACHE.begin(klass.kind)
+    bodies = list_objects(klass)
+    CACHE.fill(klass.kind, bodies)
+    return len(bodies)
+
+
+@kopf.on.startup()
+async def sync(**kwargs):
+    from open4k.controllers import RESOURCES
+
+    for klass in RESOURCES.values():
+        try:
+            count = await executor.run(load, klass)
+        except Exception:
+            LOG.exception(f"Failed to list {klass.kind}, cache is not used")
+            continue
+        LOG.info(f"Cached {count} {klass.kind} objects")
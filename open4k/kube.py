@@ -4,6 +4,7 @@ from hashlib import sha256
 import inspect
 import json
 import sys
+import threading
 from typing import List
 import functools
 
@@ -57,16 +58,58 @@ def get_kubernetes_objects():
 KUBE_OBJECTS = get_kubernetes_objects()
 
 
+# Classes built from API discovery by (api_version, kind).
+DISCOVERED_OBJECTS = {}
+DISCOVERY_LOCK = threading.Lock()
+
+
+def discover(api, api_version):
+    """Build classes for all kinds of api_version with one API request."""
+    r = api.get(version=api_version)
+    api.raise_for_status(r)
+    objects = {}
+    for resource in r.json()["resources"]:
+        # NOTE: skip subresources like pods/status
+        if "/" in resource["name"]:
+            continue
+        base = (
+            pykube.objects.NamespacedAPIObject
+            if resource["namespaced"]
+            else pykube.objects.APIObject
+        )
+        objects[(api_version, resource["kind"])] = type(
+            resource["kind"],
+            (base,),
+            {
+                "version": api_version,
+                "endpoint": resource["name"],
+                "kind": resource["kind"],
+            },
+        )
+    LOG.debug(f"Discovered {len(objects)} kinds in {api_version}")
+    return objects
+
+
 def object_factory(api, api_version, kind):
     """Dynamically builds kubernetes objects python class.
 
     1. Objects from openstack_operator.pykube.KUBE_OBJECTS
     2. Objects from pykube.objects
     3. Generic kubernetes object
+
+    Generic classes are built for all kinds of an api version at once
+    and discovery is repeated only when the kind is not known yet.
     """
-    resource = KUBE_OBJECTS.get(
-        (api_version, kind), pykube.object_factory(api, api_version, kind)
-    )
+    key = (api_version, kind)
+    resource = KUBE_OBJECTS.get(key) or DISCOVERED_OBJECTS.get(key)
+    if resource is None:
+        with DISCOVERY_LOCK:
+            resource = DISCOVERED_OBJECTS.get(key)
+            if resource is None:
+                DISCOVERED_OBJECTS.update(discover(api, api_version))
+                resource = DISCOVERED_OBJECTS.get(key)
+    if resource is None:
+        raise ValueError(f"unknown resource kind {kind!r}")
     return resource
 
 
@@ -512,19 +555,40 @@ def wait_for_secret(namespace, name):
     wait_for_resource(pykube.Secret, name, namespace)
 
 
+def apply(obj, field_manager=None, subresource=None, force=False):
+    """Create or update obj with server-side apply.
+
+    obj.obj must contain apiVersion, kind, metadata and only the fields
+    owned by the field manager. Fields owned by another manager cause
+    a conflict error unless force is set.
+    """
+    params = {"fieldManager": field_manager or settings.OPEN4K_FIELD_MANAGER}
+    if force:
+        params["force"] = "true"
+    r = obj.api.patch(
+        **obj.api_kwargs(
+            subresource=subresource,
+            params=params,
+            headers={"Content-Type": "application/apply-patch+yaml"},
+            data=json.dumps(obj.obj),
+        )
+    )
+    obj.api.raise_for_status(r)
+    obj.set_obj(r.json())
+
+
 def save_secret_data(
     namespace: str, name: str, data: Dict[str, str], labels=None
 ):
-    secret = {"metadata": {"name": name, "namespace": namespace}, "data": data}
+    secret = {
+        "apiVersion": pykube.Secret.version,
+        "kind": pykube.Secret.kind,
+        "metadata": {"name": name, "namespace": namespace},
+        "data": data,
+    }
     if labels is not None:
         secret["metadata"]["labels"] = labels
-
-    try:
-        find(pykube.Secret, name, namespace)
-    except pykube.exceptions.ObjectDoesNotExist:
-        pykube.Secret(api, secret).create()
-    else:
-        pykube.Secret(api, secret).update()
+    apply(pykube.Secret(api, secret), force=True)
 
 
 async def wait_for_deleted(
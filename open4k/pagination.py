@@ -0,0 +1,74 @@
+from urllib import parse as urlparse
+
+from open4k import settings
+from open4k import utils
+
+LOG = utils.get_logger(__name__)
+
+
+def next_marker(page, objects):
+    """Return the marker of the next page or None if page is the last.
+
+    Nova and Neutron put the next page link into <objects>_links,
+    Glance puts it into next.
+    """
+    link = page.get("next")
+    for item in page.get(f"{objects}_links") or []:
+        if item.get("rel") == "next":
+            link = item["href"]
+    if not link:
+        return None
+    query = urlparse.parse_qs(urlparse.urlsplit(link).query)
+    return query.get("marker", [None])[0]
+
+
+class Pages:
+    """Marker and limit state of a paginated list call.
+
+    limit caps the total number of objects, pages are requested by
+    settings.OPEN4K_LIST_PAGE_SIZE objects.
+    """
+
+    def __init__(self, objects, limit, filters):
+        self.objects = objects
+        self.filters = filters
+        self.left = None if limit is None else int(limit)
+        self.marker = None
+        self.done = False
+
+    def params(self):
+        params = dict(self.filters)
+        params["limit"] = settings.OPEN4K_LIST_PAGE_SIZE
+        if self.left is not None:
+            params["limit"] = min(self.left, params["limit"])
+        if self.marker:
+            params["marker"] = self.marker
+        return params
+
+    def take(self, page):
+        """Return objects of the page and move to the next one."""
+        objs = page[self.objects][: self.left]
+        if self.left is not None:
+            self.left -= len(objs)
+        self.marker = next_marker(page, self.objects)
+        self.done = not self.marker or self.left == 0
+        if not self.done:
+            LOG.debug(
+                f"Listing next page of {self.objects} from {self.marker}"
+            )
+        return objs
+
+
+def paginate(func, objects, limit=None, **filters):
+    """Yield objects of all pages of a list call."""
+    pages = Pages(objects, limit, filters)
+    while not pages.done:
+        yield from pages.take(func(**pages.params()))
+
+
+async def apaginate(func, objects, limit=None, **filters):
+    """Yield objects of all pages of an async list call."""
+    pages = Pages(objects, limit, filters)
+    while not pages.done:
+        for obj in pages.take(await func(**pages.params())):
+            yield obj
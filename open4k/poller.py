@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from open4k import client
+from open4k import pagination
+from open4k import settings
+from open4k import utils
+
+LOG = utils.get_logger(__name__)
+
+READY_STATUSES = {"ACTIVE", "ERROR", "DELETED"}
+
+
+class ReadinessPoller:
+    """Waits for servers of a cloud to leave BUILD state.
+
+    All waiting servers are checked with a single list_servers call
+    filtered by changes-since. The polling interval is doubled while
+    nothing changes and reset once some server changes its status.
+    """
+
+    def __init__(self, namespace, cloud):
+        self.namespace = namespace
+        self.cloud = cloud
+        self.waiting = {}
+        self.since = None
+        self.task = None
+
+    async def wait(self, server_id):
+        future = self.waiting.get(server_id)
+        if future is None:
+            future = asyncio.get_event_loop().create_future()
+            self.waiting[server_id] = future
+            since = time.time() - settings.OPEN4K_POLLER_CHANGES_SINCE_MARGIN
+            self.since = (
+                since if self.since is None else min(self.since, since)
+            )
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+        return await asyncio.shield(future)
+
+    async def run(self):
+        interval = settings.OPEN4K_POLLER_MIN_INTERVAL
+        while self.waiting:
+            await asyncio.sleep(interval)
+            try:
+                changed = await self.poll()
+            except Exception:
+                LOG.exception(f"Failed to poll servers in {self.cloud}")
+                changed = False
+            if changed:
+                interval = settings.OPEN4K_POLLER_MIN_INTERVAL
+            else:
+                interval = min(
+                    interval * 2, settings.OPEN4K_POLLER_MAX_INTERVAL
+                )
+
+    async def poll(self):
+        started = time.time()
+        since = utils.isotime(self.since)
+        c = await client.get_async_client(
+            self.namespace, self.cloud, "compute"
+        )
+        servers = [
+            server
+            async for server in pagination.apaginate(
+                c.servers.list_servers, "servers", **{"changes-since": since}
+            )
+        ]
+        self.since = started - settings.OPEN4K_POLLER_CHANGES_SINCE_MARGIN
+        changed = False
+        for server in servers:
+            future = self.waiting.get(server["id"])
+            if future is None or server["status"] not in READY_STATUSES:
+                continue
+            self.waiting.pop(server["id"])
+            if not future.done():
+                future.set_result(server)
+            changed = True
+        LOG.debug(
+            f"Polled {len(servers)} servers in {self.cloud}, "
+            f"{len(self.waiting)} still waiting"
+        )
+        return changed
+
+
+POLLERS = {}
+
+
+async def wait_ready(namespace, cloud, server_id):
+    """Return the server once it becomes ACTIVE, ERROR or DELETED."""
+    poller = POLLERS.get((namespace, cloud))
+    if poller is None:
+        poller = POLLERS[(namespace, cloud)] = ReadinessPoller(
+            namespace, cloud
+        )
+    return await poller.wait(server_id)
@@ -1,46 +1,313 @@
+import concurrent.futures
+import hashlib
 import json
+import os
+import threading
 import time
 
+import yaml
+
 from open4k import client
+from open4k import informer
 from open4k import kube
+from open4k import pagination
 from open4k import settings
+from open4k import utils
+from open4k import writer
 from open4k.controllers import RESOURCES
 
+LOG = utils.get_logger(__name__)
 
-def import_resources(cloud, resource, list_filter=None, dry_run=False):
-    klass = RESOURCES[resource]
+
+class Checkpoint:
+    """Append-only record of imported objects.
+
+    Each line holds "cloud kind id" of an imported object or
+    "cloud kind *" once all objects of the kind in the cloud are imported.
+    Without path the record is kept in memory only.
+    """
+
+    def __init__(self, path=None):
+        self.lock = threading.Lock()
+        self.done = set()
+        self.file = None
+        if path:
+            if os.path.exists(path):
+                with open(path) as f:
+                    self.done.update(tuple(line.split()) for line in f)
+            self.file = open(path, "a")
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def add(self, *key):
+        with self.lock:
+            self.done.add(key)
+            if self.file is not None:
+                self.file.write(" ".join(key) + "\n")
+                self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def manifest(cloud, klass, os_obj):
+    """Return the unmanaged resource for an OpenStack object."""
+    part = os_obj.get("name")
+    if not part:
+        part = os_obj["id"]
+    return {
+        "apiVersion": klass.version,
+        "kind": klass.kind,
+        "metadata": {
+            "name": kube.escape(f"{cloud}-{part}"),
+            "namespace": settings.OPEN4K_NAMESPACE,
+        },
+        "spec": {"managed": False, "cloud": cloud},
+    }
+
+
+class Exporter:
+    """Writes resource manifests as multi-document YAML or JSON lines."""
+
+    FORMATS = ["yaml", "jsonl"]
+
+    def __init__(self, stream, fmt):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown export format {fmt}")
+        self.stream = stream
+        self.fmt = fmt
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        if self.fmt == "yaml":
+            text = "---\n" + yaml.safe_dump(data, default_flow_style=False)
+        else:
+            text = json.dumps(data) + "\n"
+        with self.lock:
+            self.stream.write(text)
+
+
+class Rewound:
+    """File-like object reading head before the rest of stream."""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.head:
+            return self.stream.read(size)
+        if size < 0:
+            data, self.head = self.head + self.stream.read(), ""
+        else:
+            data, self.head = self.head[:size], self.head[size:]
+        return data
+
+
+def read_manifests(stream):
+    """Yield manifests written by Exporter in either format.
+
+    Manifests are parsed while the stream is read, so large exports are
+    not loaded into memory as a whole.
+    """
+    head = stream.readline()
+    while head and not head.strip():
+        head = stream.readline()
+    if head.lstrip().startswith("{"):
+        line = head
+        while line:
+            if line.strip():
+                yield json.loads(line)
+            line = stream.readline()
+        return
+    for data in yaml.safe_load_all(Rewound(head, stream)):
+        if data:
+            yield data
+
+
+def load(data):
+    """Create or update the resource of an exported manifest.
+
+    Apply of the main resource drops status, it is written to the
+    status subresource separately.
+    """
+    klass = {k.kind: k for k in RESOURCES.values()}[data["kind"]]
+    data = dict(data)
+    status = data.pop("status", None)
+    obj = klass(kube.api, data)
+    kube.apply(obj, field_manager=settings.OPEN4K_IMPORT_FIELD_MANAGER)
+    if status:
+        writer.WRITER.submit(obj, status)
+
+
+def shard_of(cloud, kind, os_id, count):
+    """Return the shard of an OpenStack object, the same in every process."""
+    key = f"{cloud}/{kind}/{os_id}".encode()
+    return int(hashlib.sha256(key).hexdigest()[:8], 16) % count
+
+
+CACHE_LOCK = threading.Lock()
+
+
+def fill_cache(klass):
+    """List klass resources into the informer cache unless it has them."""
+    with CACHE_LOCK:
+        if klass.kind not in informer.CACHE.synced:
+            count = informer.load(klass)
+            LOG.info(f"Listed {count} {klass.kind} objects")
+
+
+def list_os_objs(cloud, klass, list_filter=None):
     cl = client.get_client(
         settings.OPEN4K_NAMESPACE, cloud, klass.api["service"]
     )
-    api_object = getattr(cl, klass.api["objects"])
-    func = getattr(api_object, klass.api["list"])
-    os_objs = func(**(list_filter or {}))[klass.api["objects"]]
-    for os_obj in os_objs:
+    func = getattr(getattr(cl, klass.api["objects"]), klass.api["list"])
+    return pagination.paginate(
+        func, klass.api["objects"], **(list_filter or {})
+    )
+
+
+def import_object(cloud, klass, os_obj):
+    """Create or update the unmanaged resource of an OpenStack object.
+
+    The informer cache of the kind must be filled.
+    """
+    obj = klass(kube.api, manifest(cloud, klass, os_obj))
+    start = time.time()
+    status = klass.object_status(os_obj)
+    current = informer.get_cached(obj)
+    if current is None:
+        # NOTE: the cache of the kind is filled, so the object is
+        # most likely new, server-side apply creates it or updates a
+        # just created one with one request.
+        kube.apply(obj, field_manager=settings.OPEN4K_IMPORT_FIELD_MANAGER)
+        writer.WRITER.submit(obj, {"applied": True, **status})
+        op = "applied"
+    elif writer.changed(klass.kind, current.get("status"), status):
+        writer.WRITER.submit(
+            obj, writer.replacing(current.get("status"), status)
+        )
+        op = "updated"
+    else:
+        op = "unchanged"
+    print(f"{klass.kind} {obj.name}: {op}", time.time() - start)
+
+
+class Importer:
+    """Imports OpenStack objects as unmanaged kubernetes resources.
+
+    Objects are written by a pool of workers threads with at most
+    2 * workers objects queued, import_resources may be called from
+    several threads to import clouds and kinds concurrently. With
+    shard_count > 1 only objects of shard shard_index are imported.
+
+    Existing resources are looked up in the informer cache, which is
+    filled by one list of each kind unless the operator already did it.
+    """
+
+    def __init__(
+        self,
+        workers,
+        checkpoint=None,
+        dry_run=False,
+        exporter=None,
+        shard_index=0,
+        shard_count=1,
+    ):
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="open4k-import"
+        )
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.checkpoint = checkpoint or Checkpoint()
+        self.dry_run = dry_run
+        self.exporter = exporter
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+
+    def import_object(self, cloud, klass, os_obj):
+        import_object(cloud, klass, os_obj)
+
+    def _run(self, key, func, *args):
+        try:
+            func(*args)
+            self.checkpoint.add(*key)
+        finally:
+            self.slots.release()
+
+    def import_resources(self, cloud, resource, list_filter=None):
+        """Import objects of the resource kind from the cloud.
+
+        Returns the number of objects failed to import.
+        """
+        klass = RESOURCES[resource]
+        if (cloud, klass.kind, "*") in self.checkpoint:
+            LOG.info(f"{klass.kind} objects of {cloud} are already imported")
+            return 0
+        os_objs = list_os_objs(cloud, klass, list_filter)
+        if not (self.dry_run or self.exporter):
+            fill_cache(klass)
+        futures = {}
+        for os_obj in os_objs:
+            if (
+                self.shard_count > 1
+                and shard_of(cloud, klass.kind, os_obj["id"], self.shard_count)
+                != self.shard_index
+            ):
+                continue
+            if self.dry_run:
+                print(json.dumps(os_obj))
+                continue
+            if self.exporter is not None:
+                data = manifest(cloud, klass, os_obj)
+                data["status"] = {
+                    "applied": True,
+                    **klass.object_status(os_obj),
+                }
+                self.exporter.write(data)
+                continue
+            key = (cloud, klass.kind, os_obj["id"])
+            if key in self.checkpoint:
+                continue
+            self.slots.acquire()
+            future = self.pool.submit(
+                self._run, key, self.import_object, cloud, klass, os_obj
+            )
+            futures[future] = key
+        failed = 0
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception:
+                LOG.exception(f"Failed to import {futures[future]}")
+                failed += 1
+        if not (failed or self.dry_run or self.exporter):
+            self.checkpoint.add(cloud, klass.kind, "*")
+        return failed
+
+    def close(self):
+        self.pool.shutdown()
+        self.checkpoint.close()
+
+
+def import_resources(cloud, resource, list_filter=None, dry_run=False):
+    """Import objects of the resource kind in the calling thread.
+
+    Suits a few objects, e.g. ports of a booted instance, without
+    starting an Importer. Returns the number of objects failed to import.
+    """
+    klass = RESOURCES[resource]
+    if not dry_run:
+        fill_cache(klass)
+    failed = 0
+    for os_obj in list_os_objs(cloud, klass, list_filter):
         if dry_run:
             print(json.dumps(os_obj))
             continue
-        part = os_obj.get("name")
-        if not part:
-            part = os_obj["id"]
-        name = kube.escape(f"{cloud}-{part}")
-        data = {
-            "apiVersion": klass.version,
-            "kind": klass.kind,
-            "metadata": {
-                "name": name,
-                "namespace": settings.OPEN4K_NAMESPACE,
-            },
-            "spec": {"managed": False, "cloud": cloud},
-        }
-        obj = klass(kube.api, data)
-        start = time.time()
-        if not obj.exists():
-            obj.create()
-            status = {"status": {"applied": True, "object": os_obj}}
-            obj.patch(status, subresource="status")
-            op = "created"
-        else:
-            status = {"status": {"object": os_obj}}
-            obj.patch(status, subresource="status")
-            op = "updated"
-        print(f"{klass.kind} {name}: {op}", time.time() - start)
+        try:
+            import_object(cloud, klass, os_obj)
+        except Exception:
+            LOG.exception(f"Failed to import {klass.kind} {os_obj['id']}")
+            failed += 1
+    return failed
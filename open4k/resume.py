@@ -0,0 +1,98 @@
+import asyncio
+
+from open4k import settings
+from open4k import utils
+
+LOG = utils.get_logger(__name__)
+
+# The number of ids to filter one list request by, keeps urls short.
+IDS_PER_LIST = 100
+
+
+class ResumeBatch:
+    """Fetches OpenStack objects of resumed resources of a kind in bulk.
+
+    On operator start kopf resumes every object. Requests for the same
+    cloud and kind received within settings.OPEN4K_RESUME_BATCH_DELAY
+    are served together. Kinds with an ids_filter are listed by the
+    requested ids, other kinds by at most half as many pages as there
+    are requests. Objects missing in the list are requested one by one.
+    Requests received while a batch is fetched make the next batch.
+    """
+
+    def __init__(self, klass, cloud):
+        self.klass = klass
+        self.cloud = cloud
+        self.waiting = {}
+        self.task = None
+
+    async def get(self, c, obj_id):
+        future = self.waiting.get(obj_id)
+        if future is None:
+            future = asyncio.get_event_loop().create_future()
+            self.waiting[obj_id] = future
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run(c))
+        return await asyncio.shield(future)
+
+    async def run(self, c):
+        while self.waiting:
+            await asyncio.sleep(settings.OPEN4K_RESUME_BATCH_DELAY)
+            await self.fetch(c)
+
+    async def list(self, c, ids):
+        """Return listed objects by id, some of ids may be missing."""
+        api = self.klass.api
+        if len(ids) < 2:
+            return {}
+        if not api.get("ids_filter"):
+            limit = len(ids) // 2 * settings.OPEN4K_LIST_PAGE_SIZE
+            return {
+                o["id"]: o
+                for o in await self.klass.list_os_objs(c, limit=limit)
+            }
+        found = {}
+        for i in range(0, len(ids), IDS_PER_LIST):
+            value = ids[i : i + IDS_PER_LIST]
+            if api.get("ids_filter_format"):
+                value = api["ids_filter_format"] % ",".join(value)
+            filters = {api["ids_filter"]: value}
+            for o in await self.klass.list_os_objs(c, **filters):
+                found[o["id"]] = o
+        return found
+
+    async def fetch(self, c):
+        waiting, self.waiting = self.waiting, {}
+        try:
+            found = await self.list(c, list(waiting))
+        except Exception:
+            LOG.exception(f"Failed to list {self.klass.kind} in {self.cloud}")
+            found = {}
+        LOG.info(
+            f"Resumed {len(waiting)} {self.klass.kind} objects in "
+            f"{self.cloud}, {len(found)} listed"
+        )
+        missing = [i for i in waiting if i not in found]
+        results = await asyncio.gather(
+            *[self.klass.get_os_obj(c, i) for i in missing],
+            return_exceptions=True,
+        )
+        found.update(zip(missing, results))
+        for obj_id, future in waiting.items():
+            if future.done():
+                continue
+            if isinstance(found[obj_id], Exception):
+                future.set_exception(found[obj_id])
+            else:
+                future.set_result(found[obj_id])
+
+
+BATCHES = {}
+
+
+async def get_os_obj(klass, c, cloud, obj_id):
+    """Return OpenStack object of a resumed resource."""
+    batch = BATCHES.get((cloud, klass.kind))
+    if batch is None:
+        batch = BATCHES[(cloud, klass.kind)] = ResumeBatch(klass, cloud)
+    return await batch.get(c, obj_id)
@@ -155,6 +155,160 @@ OSCTL_PYKUBE_HTTP_REQUEST_TIMEOUT = float(
 
 OSCTL_MAX_TASKS = int(os.environ.get("OSCTL_MAX_TASKS", 150))
 
+# The field managers of objects written with server-side apply by the
+# operator and by import_resources.
+OPEN4K_FIELD_MANAGER = os.environ.get("OPEN4K_FIELD_MANAGER", "open4k")
+OPEN4K_IMPORT_FIELD_MANAGER = os.environ.get(
+    "OPEN4K_IMPORT_FIELD_MANAGER", "open4k-import"
+)
+
+# The maximum number of OpenStack clients kept in the client pool.
+OPEN4K_CLIENT_POOL_SIZE = int(os.environ.get("OPEN4K_CLIENT_POOL_SIZE", 128))
+
+# The number of seconds an unused OpenStack client is kept in the pool.
+OPEN4K_CLIENT_POOL_IDLE_TIMEOUT = int(
+    os.environ.get("OPEN4K_CLIENT_POOL_IDLE_TIMEOUT", 1800)
+)
+
+# The number of seconds before Keystone token expiration to renew it.
+OPEN4K_CLIENT_TOKEN_REFRESH_MARGIN = int(
+    os.environ.get("OPEN4K_CLIENT_TOKEN_REFRESH_MARGIN", 300)
+)
+
+# The number of threads running blocking OpenStack calls for each cloud.
+OPEN4K_EXECUTOR_WORKERS = int(os.environ.get("OPEN4K_EXECUTOR_WORKERS", 10))
+
+# A dict of per cloud thread numbers in json format, for example
+# `OPEN4K_EXECUTOR_CLOUD_WORKERS={"devstack": 20}`.
+OPEN4K_EXECUTOR_CLOUD_WORKERS = json_from_env(
+    "OPEN4K_EXECUTOR_CLOUD_WORKERS", {}
+)
+
+# The number of threads running blocking kubernetes API calls.
+OPEN4K_EXECUTOR_KUBE_WORKERS = int(
+    os.environ.get("OPEN4K_EXECUTOR_KUBE_WORKERS", 20)
+)
+
+# The default number of seconds a blocking call may take.
+OPEN4K_EXECUTOR_TIMEOUT = float(os.environ.get("OPEN4K_EXECUTOR_TIMEOUT", 300))
+
+# The number of seconds an image may take to be transferred to a cloud.
+OPEN4K_IMAGE_TRANSFER_TIMEOUT = float(
+    os.environ.get("OPEN4K_IMAGE_TRANSFER_TIMEOUT", 3600)
+)
+
+# The size of chunks image data is streamed with.
+OPEN4K_IMAGE_CHUNK_SIZE = int(
+    os.environ.get("OPEN4K_IMAGE_CHUNK_SIZE", 1024 * 1024)
+)
+
+# The directory to cache downloaded images in. Images are streamed
+# from their sources without caching when it is empty.
+OPEN4K_IMAGE_CACHE_DIR = os.environ.get("OPEN4K_IMAGE_CACHE_DIR", "")
+
+# The maximum size of the image cache in bytes.
+OPEN4K_IMAGE_CACHE_SIZE = int(
+    os.environ.get("OPEN4K_IMAGE_CACHE_SIZE", 50 * 1024**3)
+)
+
+# The number of seconds a cached image source is used without checking
+# whether its ETag or Last-Modified changed. Sources without both are
+# downloaded again after this interval.
+OPEN4K_IMAGE_CACHE_REVALIDATE_INTERVAL = float(
+    os.environ.get("OPEN4K_IMAGE_CACHE_REVALIDATE_INTERVAL", 300)
+)
+
+# The number of concurrent range requests to download a cached image with.
+OPEN4K_IMAGE_DOWNLOAD_STREAMS = int(
+    os.environ.get("OPEN4K_IMAGE_DOWNLOAD_STREAMS", 4)
+)
+
+# The minimal image size in bytes to download it by ranges.
+OPEN4K_IMAGE_RANGE_MIN_SIZE = int(
+    os.environ.get("OPEN4K_IMAGE_RANGE_MIN_SIZE", 64 * 1024**2)
+)
+
+# The hash algorithm Glance computes os_hash_value with, images with the
+# same hash found in a cloud are reused instead of uploading.
+OPEN4K_IMAGE_HASH_ALGO = os.environ.get("OPEN4K_IMAGE_HASH_ALGO", "sha512")
+
+# The number of seconds between checks of images imported by Glance.
+OPEN4K_IMAGE_IMPORT_POLL_INTERVAL = float(
+    os.environ.get("OPEN4K_IMAGE_IMPORT_POLL_INTERVAL", 5)
+)
+
+# The maximum number of simultaneous connections of async OpenStack clients.
+OPEN4K_AIOCLIENT_CONNECTIONS = int(
+    os.environ.get("OPEN4K_AIOCLIENT_CONNECTIONS", 100)
+)
+
+# The number of seconds an async OpenStack API request may take.
+OPEN4K_AIOCLIENT_TIMEOUT = float(
+    os.environ.get("OPEN4K_AIOCLIENT_TIMEOUT", 300)
+)
+
+# The minimal and maximal number of seconds between checks of servers
+# waiting to become ACTIVE.
+OPEN4K_POLLER_MIN_INTERVAL = float(
+    os.environ.get("OPEN4K_POLLER_MIN_INTERVAL", 2)
+)
+OPEN4K_POLLER_MAX_INTERVAL = float(
+    os.environ.get("OPEN4K_POLLER_MAX_INTERVAL", 30)
+)
+
+# The number of seconds subtracted from changes-since filter to cover
+# clock skew between the operator and OpenStack.
+OPEN4K_POLLER_CHANGES_SINCE_MARGIN = int(
+    os.environ.get("OPEN4K_POLLER_CHANGES_SINCE_MARGIN", 60)
+)
+
+# The number of seconds status updates of an object are collected before
+# they are written as one patch.
+OPEN4K_STATUS_WRITE_DELAY = float(
+    os.environ.get("OPEN4K_STATUS_WRITE_DELAY", 1)
+)
+
+# Store the whole OpenStack object in status.object instead of the fields
+# listed for its kind in api_mapper.yaml.
+OPEN4K_STATUS_FULL_OBJECT = bool_from_env("OPEN4K_STATUS_FULL_OBJECT", False)
+
+# The number of seconds resumed objects are collected to be fetched from
+# OpenStack together.
+OPEN4K_RESUME_BATCH_DELAY = float(
+    os.environ.get("OPEN4K_RESUME_BATCH_DELAY", 1)
+)
+
+# The number of seconds between checks of OpenStack objects changed
+# outside of the operator. Zero disables the checks.
+OPEN4K_SYNC_INTERVAL = float(os.environ.get("OPEN4K_SYNC_INTERVAL", 60))
+
+# The number of seconds after which a resource is fetched from OpenStack
+# on resume or metadata only update even when its spec is not changed.
+OPEN4K_RESYNC_INTERVAL = float(
+    os.environ.get("OPEN4K_RESYNC_INTERVAL", 6 * 3600)
+)
+
+# The number of objects requested per page from OpenStack list APIs.
+OPEN4K_LIST_PAGE_SIZE = int(os.environ.get("OPEN4K_LIST_PAGE_SIZE", 500))
+
+# The number of threads writing imported objects to kubernetes.
+OPEN4K_IMPORT_WORKERS = int(os.environ.get("OPEN4K_IMPORT_WORKERS", 10))
+
+# The number of clouds and kinds import_resources lists concurrently.
+OPEN4K_IMPORT_LIST_WORKERS = int(
+    os.environ.get("OPEN4K_IMPORT_LIST_WORKERS", 4)
+)
+
+# The SQLite file on a persistent volume to keep the state of synced
+# objects across restarts in. The state is not kept when it is empty.
+OPEN4K_SNAPSHOT_PATH = os.environ.get("OPEN4K_SNAPSHOT_PATH", "")
+
+# The maximal age in seconds of an object state in the snapshot to skip
+# fetching the object from OpenStack on resume.
+OPEN4K_SNAPSHOT_MAX_AGE = float(
+    os.environ.get("OPEN4K_SNAPSHOT_MAX_AGE", 24 * 3600)
+)
+
 # The port number for /metrics endpoint. If the value is less or equal to zero
 # metrics http server will not start.
 OSCTL_METRICS_PORT = int(os.environ.get("OSCTL_METRICS_PORT", -1))
@@ -179,6 +333,21 @@ METRICS = {
         "The last time a k8s event was served by openstack-controller specific handler.",
         labelnames=["handler"],
     ),
+    "image_transfer_bytes": Counter(
+        "open4k_image_transfer_bytes_total",
+        "The number of image bytes uploaded to a cloud.",
+        labelnames=["cloud"],
+    ),
+    "image_transfer_throughput": Gauge(
+        "open4k_image_transfer_throughput_bytes",
+        "The throughput of the last image upload to a cloud.",
+        labelnames=["cloud"],
+    ),
+    "status_writes": Counter(
+        "open4k_status_writes_total",
+        "The number of status.object updates by result, applied or skipped.",
+        labelnames=["kind", "result"],
+    ),
 }
 
 
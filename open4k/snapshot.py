@@ -0,0 +1,173 @@
+import sqlite3
+import threading
+import time
+
+from open4k import executor
+from open4k import settings
+from open4k import utils
+
+LOG = utils.get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    kind TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    generation INTEGER,
+    PRIMARY KEY (kind, namespace, name)
+);
+CREATE TABLE IF NOT EXISTS marks (
+    cloud TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    mark REAL NOT NULL,
+    PRIMARY KEY (cloud, kind)
+);
+"""
+
+
+class Snapshot:
+    """SQLite store of what the operator last saw in OpenStack.
+
+    Keeps the status fingerprint, the time it was checked and the
+    generation of the spec it was checked for each resource, and the sync high-water mark for each (cloud, kind), so
+    they survive operator restarts.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        columns = [c[1] for c in self.db.execute("PRAGMA table_info(objects)")]
+        if "generation" not in columns:
+            self.db.execute(
+                "ALTER TABLE objects ADD COLUMN generation INTEGER"
+            )
+        self.marks = {
+            (cloud, kind): mark
+            for cloud, kind, mark in self.db.execute(
+                "SELECT cloud, kind, mark FROM marks"
+            )
+        }
+
+    def get_object(self, kind, namespace, name):
+        """Return (fingerprint, synced_at, generation) of the object or None."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT fingerprint, synced_at, generation FROM objects "
+                "WHERE kind = ? AND namespace = ? AND name = ?",
+                (kind, namespace, name),
+            ).fetchone()
+
+    def put_object(
+        self,
+        kind,
+        namespace,
+        name,
+        fingerprint,
+        synced_at=None,
+        generation=None,
+    ):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    kind,
+                    namespace,
+                    name,
+                    fingerprint,
+                    synced_at or time.time(),
+                    generation,
+                ),
+            )
+
+    def delete_object(self, kind, namespace, name):
+        with self.lock:
+            self.db.execute(
+                "DELETE FROM objects "
+                "WHERE kind = ? AND namespace = ? AND name = ?",
+                (kind, namespace, name),
+            )
+
+    def put_mark(self, cloud, kind, mark):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO marks VALUES (?, ?, ?)",
+                (cloud, kind, mark),
+            )
+            self.marks[(cloud, kind)] = mark
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+SNAPSHOT = None
+
+# IDs of objects existing in OpenStack by (cloud, kind), listed at start
+# for kinds with a stored mark.
+EXISTING = {}
+
+
+def get_snapshot():
+    """Return the snapshot or None when OPEN4K_SNAPSHOT_PATH is not set."""
+    global SNAPSHOT
+    if SNAPSHOT is None and settings.OPEN4K_SNAPSHOT_PATH:
+        SNAPSHOT = Snapshot(settings.OPEN4K_SNAPSHOT_PATH)
+        LOG.info(f"Opened snapshot {settings.OPEN4K_SNAPSHOT_PATH}")
+    return SNAPSHOT
+
+
+async def remember(kind, body, fingerprint):
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        meta = body["metadata"]
+        await executor.run(
+            snapshot.put_object,
+            kind,
+            meta["namespace"],
+            meta["name"],
+            fingerprint,
+            generation=meta.get("generation"),
+        )
+
+
+async def forget(kind, namespace, name):
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        await executor.run(snapshot.delete_object, kind, namespace, name)
+
+
+def is_fresh(klass, body):
+    """Check whether the resumed object needs no OpenStack request.
+
+    It is true when the object status is the one checked at most
+    OPEN4K_SNAPSHOT_MAX_AGE seconds ago for the same spec generation,
+    the object was listed in
+    OpenStack on start and later changes of the kind in the cloud are
+    caught up by the sync from the stored mark.
+    """
+    snapshot = get_snapshot()
+    key = (body["spec"]["cloud"], klass.kind)
+    if (
+        snapshot is None
+        or settings.OPEN4K_SYNC_INTERVAL <= 0
+        or "changes_since" not in klass.api
+        or key not in snapshot.marks
+        or utils.get_in(body, ["status", "object", "id"])
+        not in EXISTING.get(key, ())
+    ):
+        return False
+    meta = body["metadata"]
+    entry = snapshot.get_object(klass.kind, meta["namespace"], meta["name"])
+    return (
+        entry is not None
+        and entry[0] == body.get("status", {}).get("fingerprint")
+        and entry[1] > time.time() - settings.OPEN4K_SNAPSHOT_MAX_AGE
+        and entry[2] == meta.get("generation")
+    )
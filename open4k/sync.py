@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import kopf
+
+from open4k import client
+from open4k import executor
+from open4k import informer
+from open4k import kube
+from open4k import settings
+from open4k import snapshot
+from open4k import utils
+from open4k import writer
+
+LOG = utils.get_logger(__name__)
+
+# High-water marks of synced changes by (cloud, kind).
+MARKS = {}
+TASK = None
+
+
+def changes_filter(klass, since):
+    value = utils.isotime(since)
+    fmt = klass.api.get("changes_since_format")
+    if fmt:
+        value = fmt % value
+    return {klass.api["changes_since"]: value}
+
+
+async def sync(klass, cloud):
+    """Update status of klass objects changed in the cloud since the mark.
+
+    Returns the number of objects whose status was updated.
+    """
+    started = time.time()
+    since = MARKS.get((cloud, klass.kind), started)
+    since -= settings.OPEN4K_POLLER_CHANGES_SINCE_MARGIN
+    c = await client.get_async_client(
+        settings.OPEN4K_NAMESPACE, cloud, klass.api["service"]
+    )
+    os_objs = await klass.list_os_objs(c, **changes_filter(klass, since))
+    MARKS[(cloud, klass.kind)] = started
+    updated = 0
+    for os_obj in os_objs:
+        body = informer.CACHE.by_object_id(klass.kind, cloud, os_obj["id"])
+        if body is None:
+            continue
+        status = klass.object_status(os_obj)
+        if writer.changed(klass.kind, body.get("status"), status):
+            writer.WRITER.add(
+                klass(kube.api, body),
+                writer.replacing(body.get("status"), status),
+            )
+            updated += 1
+        await snapshot.remember(klass.kind, body, status["fingerprint"])
+    store = snapshot.get_snapshot()
+    if store is not None:
+        await executor.run(store.put_mark, cloud, klass.kind, started)
+    LOG.debug(
+        f"Synced {klass.kind} in {cloud}: {len(os_objs)} changed, "
+        f"{updated} updated"
+    )
+    return updated
+
+
+async def run():
+    from open4k.controllers import RESOURCES
+
+    kinds = [k for k in RESOURCES.values() if "changes_since" in k.api]
+    while True:
+        await asyncio.sleep(settings.OPEN4K_SYNC_INTERVAL)
+        try:
+            clouds = await executor.run(
+                client.get_clouds, settings.OPEN4K_NAMESPACE
+            )
+        except Exception:
+            LOG.exception("Failed to get clouds to sync")
+            continue
+        results = await asyncio.gather(
+            *[
+                sync(k, cloud)
+                for cloud in clouds.get("clouds", {})
+                for k in kinds
+            ],
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                LOG.error(f"Failed to sync OpenStack objects: {result}")
+
+
+async def list_ids(klass, cloud):
+    c = await client.get_async_client(
+        settings.OPEN4K_NAMESPACE, cloud, klass.api["service"]
+    )
+    filters = {}
+    if klass.api.get("fields_filter"):
+        filters[klass.api["fields_filter"]] = "id"
+    return {o["id"] for o in await klass.list_os_objs(c, **filters)}
+
+
+async def revalidate(store):
+    """List objects of each kind and cloud having a stored mark.
+
+    Deletions in OpenStack are not seen while the operator is down, so
+    only listed objects may be fresh according to the snapshot. Marks
+    failed to be listed are not used.
+    """
+    from open4k.controllers import RESOURCES
+
+    kinds = {k.kind: k for k in RESOURCES.values()}
+    keys = [key for key in store.marks if key[1] in kinds]
+    results = await asyncio.gather(
+        *[list_ids(kinds[kind], cloud) for cloud, kind in keys],
+        return_exceptions=True,
+    )
+    for key, result in zip(keys, results):
+        if isinstance(result, Exception):
+            LOG.error(f"Failed to revalidate snapshot of {key}: {result}")
+            store.marks.pop(key)
+        else:
+            snapshot.EXISTING[key] = result
+    for key in set(store.marks) - set(keys):
+        store.marks.pop(key)
+
+
+@kopf.on.startup()
+async def start(**kwargs):
+    global TASK
+    store = snapshot.get_snapshot()
+    if store is not None:
+        await revalidate(store)
+        MARKS.update(store.marks)
+    if settings.OPEN4K_SYNC_INTERVAL > 0:
+        TASK = asyncio.ensure_future(run())
+
+
+@kopf.on.cleanup()
+async def stop(**kwargs):
+    if TASK is not None:
+        TASK.cancel()
+    if snapshot.SNAPSHOT is not None:
+        snapshot.SNAPSHOT.close()
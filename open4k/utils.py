@@ -14,11 +14,15 @@
 
 import asyncio
 import base64
+import datetime
 import functools
+import hashlib
+import json
 import logging
 import os
 import threading
-from typing import Dict, List
+import time
+from typing import Any, Dict, List
 
 from open4k import settings
 from kopf.engines.posting import event_queue_var
@@ -43,6 +47,90 @@ def get_in(d: Dict, keys: List, default=None):
         return default
 
 
+def project(obj: Dict, fields: List) -> Dict:
+    """Returns obj with the fields only, or the whole obj if fields are empty
+    or settings.OPEN4K_STATUS_FULL_OBJECT is set.
+
+    >>> project({"id": 1, "name": "a", "links": []}, ["id", "name"])
+    {'id': 1, 'name': 'a'}
+
+    """
+    if not fields or settings.OPEN4K_STATUS_FULL_OBJECT:
+        return obj
+    return {k: obj[k] for k in fields if k in obj}
+
+
+def replacement(current: Any, new: Any) -> Any:
+    """Returns a merge patch that turns current into new.
+
+    Keys of current missing in new are set to None to be removed.
+
+    >>> replacement({"id": 1, "links": [], "a": {"b": 1}}, {"id": 2, "a": {}})
+    {'links': None, 'id': 2, 'a': {'b': None}}
+
+    """
+    if not isinstance(current, dict) or not isinstance(new, dict):
+        return new
+    patch = {k: None for k in current if k not in new}
+    for k, v in new.items():
+        patch[k] = replacement(current.get(k), v)
+    return patch
+
+
+def fingerprint(obj: Dict) -> str:
+    """Returns a hash of obj that does not depend on its keys order."""
+    data = json.dumps(obj, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def isotime(ts: float) -> str:
+    """Returns UTC ISO 8601 representation of a unix timestamp.
+
+    >>> isotime(0)
+    '1970-01-01T00:00:00Z'
+
+    """
+    return datetime.datetime.utcfromtimestamp(ts).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+
+
+def parse_isotime(value: str) -> float:
+    """Returns unix timestamp of a time in isotime format.
+
+    >>> parse_isotime("1970-01-01T00:01:00Z")
+    60.0
+
+    """
+    return (
+        datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+        .replace(tzinfo=datetime.timezone.utc)
+        .timestamp()
+    )
+
+
+def observed_status(body: Dict) -> Dict:
+    """Returns status fields recording that body spec was reconciled now."""
+    return {
+        "observedGeneration": body["metadata"].get("generation"),
+        "specHash": fingerprint(body["spec"]),
+        "syncedAt": isotime(time.time()),
+    }
+
+
+def is_observed(body: Dict, interval: float) -> bool:
+    """Checks whether body spec was reconciled less than interval ago."""
+    status = body.get("status", {})
+    synced_at = status.get("syncedAt")
+    return (
+        synced_at is not None
+        and status.get("observedGeneration")
+        == body["metadata"].get("generation")
+        and status.get("specHash") == fingerprint(body["spec"])
+        and parse_isotime(synced_at) > time.time() - interval
+    )
+
+
 def get_logger(name: str) -> logging.Logger:
     verbose = os.getenv("KOPF_RUN_VERBOSE")
     debug = os.getenv("KOPF_RUN_DEBUG")
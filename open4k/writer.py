@@ -0,0 +1,162 @@
+import asyncio
+import copy
+
+import kopf
+
+from open4k import executor
+from open4k import settings
+from open4k import utils
+
+LOG = utils.get_logger(__name__)
+
+
+def merge(dst, src):
+    """Apply merge patch src to dst in place."""
+    for k, v in src.items():
+        if isinstance(v, dict) and isinstance(dst.get(k), dict):
+            merge(dst[k], v)
+        else:
+            dst[k] = copy.deepcopy(v)
+    return dst
+
+
+def changed(kind, current, status):
+    """Check whether status has another fingerprint than current status.
+
+    The result is counted in status_writes metric.
+    """
+    result = (current or {}).get("fingerprint") != status["fingerprint"]
+    settings.METRICS["status_writes"].labels(
+        kind, "applied" if result else "skipped"
+    ).inc()
+    return result
+
+
+def replacing(current, status):
+    """Return status patch replacing status.object of current status.
+
+    Merge patches keep keys missing in the new object, e.g. all fields
+    of an object stored before status.object was projected.
+    """
+    old = (current or {}).get("object")
+    return {**status, "object": utils.replacement(old, status["object"])}
+
+
+class StatusWriter:
+    """Writes status of kubernetes objects with coalesced patches.
+
+    Updates of an object received within delay are merged and written
+    by one PATCH call. Each object has at most one write in flight, so
+    its updates are applied in the order they were added.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.pending = {}
+        self.tasks = {}
+        self.writes = set()
+        self.loop = None
+
+    @staticmethod
+    def _key(obj):
+        return obj.kind, obj.namespace, obj.name
+
+    def add(self, obj, status):
+        """Schedule status update of obj, must be called in the loop."""
+        key = self._key(obj)
+        if key in self.pending:
+            merge(self.pending[key][1], status)
+        else:
+            self.pending[key] = (obj, copy.deepcopy(status))
+        if key not in self.tasks:
+            self.tasks[key] = asyncio.ensure_future(self._run(key))
+
+    def submit(self, obj, status):
+        """Schedule status update of obj from any thread.
+
+        The status is written right away when the writer is not started,
+        e.g. by command line tools.
+        """
+        if self.loop is None or not self.loop.is_running():
+            obj.patch({"status": status}, subresource="status")
+            return
+        self.loop.call_soon_threadsafe(self.add, obj, status)
+
+    async def write(self, obj, status):
+        """Write status of obj right away, errors are raised.
+
+        Pending updates of obj are written by the same patch, and an
+        update in flight is awaited first, so none of them can land
+        after this one.
+        """
+        key = self._key(obj)
+        pending = self.pending.pop(key, None)
+        if pending is not None:
+            status = merge(pending[1], status)
+        task = self.tasks.get(key)
+        if task is not None:
+            await asyncio.wait([task])
+        await self._patch(obj, status)
+
+    async def _patch(self, obj, status):
+        """Patch status of obj, the patch is tracked until it returns.
+
+        Cancelling the caller does not stop a patch running in the
+        executor, flush waits for it.
+        """
+        write = asyncio.ensure_future(
+            executor.run(obj.patch, {"status": status}, subresource="status")
+        )
+        self.writes.add(write)
+        write.add_done_callback(self.writes.discard)
+        await asyncio.shield(write)
+
+    async def _run(self, key):
+        try:
+            while key in self.pending:
+                await asyncio.sleep(self.delay)
+                if key not in self.pending:
+                    break
+                obj, status = self.pending.pop(key)
+                try:
+                    await self._patch(obj, status)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    LOG.exception(f"Failed to update status of {key}")
+        finally:
+            self.tasks.pop(key, None)
+
+    async def flush(self):
+        """Write all pending updates right away.
+
+        Writes in flight are awaited first, so they cannot overwrite
+        the pending updates.
+        """
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        self.tasks.clear()
+        if tasks:
+            await asyncio.wait(tasks)
+        if self.writes:
+            await asyncio.wait(set(self.writes))
+        while self.pending:
+            key, (obj, status) = self.pending.popitem()
+            try:
+                obj.patch({"status": status}, subresource="status")
+            except Exception:
+                LOG.exception(f"Failed to update status of {key}")
+
+
+WRITER = StatusWriter(settings.OPEN4K_STATUS_WRITE_DELAY)
+
+
+@kopf.on.startup()
+async def start(**kwargs):
+    WRITER.loop = asyncio.get_event_loop()
+
+
+@kopf.on.cleanup()
+async def flush(**kwargs):
+    await WRITER.flush()
@@ -6,6 +6,11 @@ from open4k import kube
 from open4k import client
 from open4k import settings
 from open4k import hooks
+from open4k import informer
+from open4k import pagination
+from open4k import resume
+from open4k import snapshot
+from open4k import writer
 
 LOG = utils.get_logger(__name__)
 kopf_on_args = ["{{ group }}.{{ domain }}", "{{ version }}", "{{ plural }}"]
@@ -16,72 +21,114 @@ class {{ kind }}(pykube.objects.NamespacedAPIObject, kube.HelmBundleMixin):
     endpoint = "{{ plural }}"
     kind = "{{ kind }}"
     api = {{ api }}
+    fields = {{ fields | default([]) }}
+
+    @classmethod
+    def object_status(cls, os_obj):
+        os_obj = utils.project(os_obj, cls.fields)
+        return {"object": os_obj, "fingerprint": utils.fingerprint(os_obj)}
 
     @staticmethod
-    def get_os_obj(c, obj_id, id_name=None):
+    async def get_os_obj(c, obj_id, id_name=None):
         if not id_name:
             id_name = '{{ api.object }}_id'
-        os_obj = getattr(getattr(c, "{{ api.objects }}"), "{{ api.get_ }}")(
+        os_obj = await getattr(getattr(c, "{{ api.objects }}"), "{{ api.get_ }}")(
             **{id_name: obj_id})
         if {{ api }}.get("object_envelope", True):
             os_obj = os_obj[list(os_obj)[0]]
         return os_obj
 
-    def create_os_obj(c, body):
-        os_obj = c.{{ api.objects }}.{{ api.create}}(
+    @staticmethod
+    async def list_os_objs(c, **filters):
+        func = getattr(getattr(c, "{{ api.objects }}"), "{{ api.list }}")
+        return [o async for o in pagination.apaginate(
+            func, "{{ api.objects }}", **filters)]
+
+    async def create_os_obj(c, body):
+        os_obj = await c.{{ api.objects }}.{{ api.create}}(
             {{ api.object }}=body
         )
         if {{ api }}.get("object_envelope", True):
             os_obj = os_obj[list(os_obj)[0]]
         return os_obj
 
-    def delete_os_obj(c, obj_id):
-        getattr(getattr(c, "{{ api.objects }}"), "{{ api.delete}}")({{ api.object }}_id=obj_id)
+    async def delete_os_obj(c, obj_id):
+        await getattr(getattr(c, "{{ api.objects }}"), "{{ api.delete}}")({{ api.object }}_id=obj_id)
+
+
+@kopf.on.event(*kopf_on_args)
+async def {{ kind | lower }}_event_handler(event, **kwargs):
+    informer.CACHE.handle(event)
 
 
 @kopf.on.create(*kopf_on_args)
 @kopf.on.update(*kopf_on_args)
 @kopf.on.resume(*kopf_on_args)
-async def {{ kind | lower }}_change_handler(body, name, namespace, **kwargs):
+async def {{ kind | lower }}_change_handler(
+        body, name, namespace, patch, reason, **kwargs):
     LOG.info(f"Got {{ kind }} change event {name}")
     if body["spec"].get("managed") == False:
         LOG.info(f"{name} is not managed")
         return
 
-    c = client.get_client(
-        settings.OPEN4K_NAMESPACE, body["spec"]["cloud"], "{{ api.service }}")
-    obj = kube.find({{ kind }}, name, namespace=namespace)
+    cloud = body["spec"]["cloud"]
+    c = await client.get_async_client(
+        settings.OPEN4K_NAMESPACE, cloud, "{{ api.service }}")
 
     klass = {{ kind }}
 
     if body.get("status", {}).get("applied") == True:
+        if utils.is_observed(body, settings.OPEN4K_RESYNC_INTERVAL):
+            LOG.info(f"{name} spec is already reconciled")
+            return
+        if reason == "resume" and snapshot.is_fresh(klass, body):
+            LOG.info(f"{name} is up to date according to snapshot")
+            return
         LOG.info(f"{name} exists, updating ...")
         obj_id = body['status']['object'].get('id')
         id_name = None
         if not obj_id:
             id_name = "uuid"
             obj_id = body['status']['object'].get('uuid')
-        os_obj = klass.get_os_obj(c, obj_id, id_name)
-        obj.patch(
-            {"status": {"object": os_obj}},
-            subresource="status",
-        )
+        if reason == "resume" and not id_name:
+            os_obj = await resume.get_os_obj(klass, c, cloud, obj_id)
+        else:
+            os_obj = await klass.get_os_obj(c, obj_id, id_name)
+        status = klass.object_status(os_obj)
+        if writer.changed(klass.kind, body["status"], status):
+            patch.status.update(writer.replacing(body["status"], status))
+        patch.status.update(utils.observed_status(body))
+        await snapshot.remember(klass.kind, body, status["fingerprint"])
         return
 
     try:
-        os_obj = klass.create_os_obj(c, body["spec"]["body"])
+        os_obj = await klass.create_os_obj(c, body["spec"]["body"])
     except Exception as e:
-        obj.patch(
-            {"status": {"applied": False, "error": str(e)}},
-            subresource="status",
-        )
+        patch.status.update({"applied": False, "error": str(e)})
         raise
-    obj.patch(
-        {"status": {"applied": True, "error": "", "object": os_obj}},
-        subresource="status",
-    )
-    await hooks.call("{{ kind | lower }}", "post_create",
-                     c, klass, obj, os_obj)
+    status = {
+        "applied": True,
+        "error": "",
+        **klass.object_status(os_obj),
+        **utils.observed_status(body),
+    }
+    await snapshot.remember(klass.kind, body, status["fingerprint"])
+    if not hooks.exists("{{ kind | lower }}", "post_create"):
+        patch.status.update(status)
+        return
+    # NOTE: the hook may take long, store the created object right away
+    # to not create it again if the operator is restarted meanwhile.
+    # The write is awaited, so it cannot land after the hook result.
+    obj = await informer.find({{ kind }}, name, namespace=namespace)
+    await writer.WRITER.write(obj, status)
+    written = status
+    status = await hooks.call("{{ kind | lower }}", "post_create",
+                              c, klass, obj, os_obj) or {}
+    if "object" in status:
+        status.update(klass.object_status(status.pop("object")))
+        status = writer.replacing(written, status)
+        await snapshot.remember(klass.kind, body, status["fingerprint"])
+    patch.status.update(status)
 
 
 @kopf.on.delete(*kopf_on_args)
@@ -95,13 +142,19 @@ async def {{ kind | lower }}_delete_handler(body, name, namespace, **kwargs):
         LOG.info(f"{name} was not applied successfully")
         return
 
+    if body["status"].get("linked"):
+        LOG.info(f"{name} is linked to a shared object, keeping it")
+        return
+
     klass = {{ kind }}
+    await snapshot.forget(klass.kind, namespace, name)
 
     os_obj_id = body["status"].get("object", {}).get("id")
     if not os_obj_id:
         LOG.info(f"Cannot get id for {name}")
         return
 
-    c = client.get_client(
-        settings.OPEN4K_NAMESPACE, body["spec"]["cloud"], "{{ api.service }}")
-    klass.delete_os_obj(c, os_obj_id)
+    cloud = body["spec"]["cloud"]
+    c = await client.get_async_client(
+        settings.OPEN4K_NAMESPACE, cloud, "{{ api.service }}")
+    await klass.delete_os_obj(c, os_obj_id)
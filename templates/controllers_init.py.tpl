@@ -1,3 +1,5 @@
+# NOTE: imported to register the sync startup and cleanup handlers.
+from open4k import sync  # noqa: F401
 {% for doc in docs %}
 from . import {{ doc.kind | lower }}
 {% endfor %}
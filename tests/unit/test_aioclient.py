@@ -0,0 +1,32 @@
+from open4k import aioclient
+
+
+def test_operations_grouped_by_resource():
+    operations = aioclient.get_operations("compute")
+    op = operations["servers"]["get_server"]
+    assert (op.method, op.path) == ("GET", "/servers/{server_id}")
+    assert "create_flavor" in operations["flavors"]
+
+
+def test_operation_request():
+    op = aioclient.get_operations("network")["ports"]["list_ports"]
+    path, query, body = op.request({"device_id": "d1", "limit": 10})
+    assert (path, query, body) == (
+        "/ports",
+        {"device_id": "d1", "limit": 10},
+        None,
+    )
+
+    op = aioclient.get_operations("compute")["servers"]["create_server"]
+    path, query, body = op.request({"server": {"server": {"name": "vm"}}})
+    assert (path, query, body) == (
+        "/servers",
+        {},
+        {"server": {"name": "vm"}},
+    )
+
+
+def test_client_resources():
+    c = aioclient.AsyncClient("image", "http://glance:9292", "token")
+    assert c.endpoint == "http://glance:9292/v2/"
+    assert c.images.get_image.operation.path == "/images/{image_id}"
@@ -0,0 +1,108 @@
+import base64
+import datetime
+from unittest import mock
+
+import yaml
+
+from open4k import client
+
+
+def _access(token, expires_in, lifetime=3600):
+    access = mock.Mock(auth_token=token)
+    access.expires = datetime.datetime.now(
+        datetime.timezone.utc
+    ) + datetime.timedelta(seconds=expires_in)
+    access.issued = access.expires - datetime.timedelta(seconds=lifetime)
+    return access
+
+
+@mock.patch.object(client, "_set_token")
+@mock.patch.object(client, "_build_client")
+@mock.patch.object(client.CloudSession, "endpoint")
+@mock.patch.object(client.CloudSession, "authenticate", autospec=True)
+def test_pool_reuses_token(auth, endpoint, build, set_token):
+    auth.side_effect = lambda s: setattr(s, "access", _access("t1", 3600))
+    pool = client.ClientPool(10, 600)
+
+    c1 = pool.get("ns", "cloud", "compute")
+    c2 = pool.get("ns", "cloud", "compute")
+    pool.get("ns", "cloud", "network")
+
+    assert c1 is c2
+    assert auth.call_count == 1
+    assert build.call_count == 2
+
+
+@mock.patch.object(client, "_set_token")
+@mock.patch.object(client, "_build_client")
+@mock.patch.object(client.CloudSession, "endpoint")
+@mock.patch.object(client.CloudSession, "authenticate", autospec=True)
+def test_pool_refreshes_expiring_token(auth, endpoint, build, set_token):
+    auth.side_effect = lambda s: setattr(s, "access", _access("t1", 60))
+    pool = client.ClientPool(10, 600)
+
+    c1 = pool.get("ns", "cloud", "compute")
+    c2 = pool.get("ns", "cloud", "compute")
+
+    assert c1 is c2
+    assert auth.call_count == 2
+    set_token.assert_called_once_with(c1, "t1")
+
+
+@mock.patch.object(client, "_set_token")
+@mock.patch.object(client, "_build_client")
+@mock.patch.object(client.CloudSession, "endpoint")
+@mock.patch.object(client.CloudSession, "authenticate", autospec=True)
+def test_pool_reuses_short_lived_token(auth, endpoint, build, set_token):
+    auth.side_effect = lambda s: setattr(
+        s, "access", _access("t1", 200, lifetime=240)
+    )
+    pool = client.ClientPool(10, 600)
+
+    pool.get("ns", "cloud", "compute")
+    pool.get("ns", "cloud", "compute")
+
+    assert auth.call_count == 1
+    set_token.assert_not_called()
+
+
+@mock.patch.object(client, "_set_token")
+@mock.patch.object(client, "_build_client")
+@mock.patch.object(client.CloudSession, "endpoint")
+@mock.patch.object(client.CloudSession, "authenticate", autospec=True)
+def test_pool_evicts_lru(auth, endpoint, build, set_token):
+    auth.side_effect = lambda s: setattr(s, "access", _access("t1", 3600))
+    pool = client.ClientPool(2, 600)
+
+    pool.get("ns", "cloud1", "compute")
+    pool.get("ns", "cloud2", "compute")
+    pool.get("ns", "cloud1", "compute")
+    pool.get("ns", "cloud3", "compute")
+
+    assert list(pool.used) == [
+        ("ns", "cloud1", "compute", False),
+        ("ns", "cloud3", "compute", False),
+    ]
+    assert ("ns", "cloud2") not in pool.sessions
+
+
+def _secret(clouds):
+    data = base64.b64encode(yaml.safe_dump({"clouds": clouds}).encode())
+    return {"data": {"clouds.yaml": data.decode()}}
+
+
+@mock.patch.object(client, "POOL")
+@mock.patch.dict(client.CLOUDS, clear=True)
+def test_update_clouds_invalidates_changed_clouds(pool):
+    client.update_clouds("ns", _secret({"c1": {"a": 1}, "c2": {"a": 1}}))
+    pool.invalidate.assert_not_called()
+
+    clouds = client.update_clouds(
+        "ns", _secret({"c1": {"a": 1}, "c2": {"a": 2}, "c3": {}})
+    )
+
+    assert client.get_clouds("ns") is clouds
+    assert sorted(pool.invalidate.call_args_list) == [
+        mock.call("ns", "c2"),
+        mock.call("ns", "c3"),
+    ]
@@ -0,0 +1,245 @@
+import contextlib
+from unittest import mock
+
+from kopf.structs import patches
+import pytest
+
+from open4k import utils
+from open4k.controllers import flavor
+
+NOW = 1000000
+
+
+def _body(status=None):
+    body = {
+        "metadata": {"name": "f1", "namespace": "ns", "generation": 1},
+        "spec": {"cloud": "c1", "body": {"name": "f1"}},
+    }
+    if status:
+        body["status"] = status
+    return body
+
+
+def _observed():
+    return {
+        "observedGeneration": 1,
+        "specHash": utils.fingerprint(_body()["spec"]),
+        "syncedAt": utils.isotime(NOW),
+    }
+
+
+async def _get_client(*args):
+    return "client"
+
+
+@contextlib.contextmanager
+def _mocks(**methods):
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(
+            mock.patch.object(flavor.client, "get_async_client", _get_client)
+        )
+        stack.enter_context(
+            mock.patch.object(utils.time, "time", return_value=NOW)
+        )
+        for name, func in methods.items():
+            stack.enter_context(mock.patch.object(flavor.Flavor, name, func))
+        yield stack.enter_context(mock.patch.object(flavor.writer, "WRITER"))
+
+
+@pytest.mark.asyncio
+async def test_change_handler_updates_status_by_kopf_patch():
+    async def _get_os_obj(c, obj_id, id_name=None):
+        return {"id": obj_id, "name": "f1"}
+
+    patch = patches.Patch()
+    with _mocks(get_os_obj=_get_os_obj) as writer:
+        await flavor.flavor_change_handler(
+            _body({"applied": True, "object": {"id": "id1"}}),
+            "f1",
+            "ns",
+            patch,
+            "update",
+        )
+
+    os_obj = {"id": "id1", "name": "f1"}
+    assert patch == {
+        "status": {
+            "object": os_obj,
+            "fingerprint": utils.fingerprint(os_obj),
+            **_observed(),
+        }
+    }
+    writer.add.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_change_handler_skips_unchanged_object():
+    async def _get_os_obj(c, obj_id, id_name=None):
+        return {"id": obj_id, "name": "f1", "links": []}
+
+    os_obj = {"id": "id1", "name": "f1"}
+    patch = patches.Patch()
+    with _mocks(get_os_obj=_get_os_obj):
+        await flavor.flavor_change_handler(
+            _body(
+                {
+                    "applied": True,
+                    "object": os_obj,
+                    "fingerprint": utils.fingerprint(os_obj),
+                }
+            ),
+            "f1",
+            "ns",
+            patch,
+            "update",
+        )
+
+    assert patch == {"status": _observed()}
+
+
+@pytest.mark.asyncio
+async def test_change_handler_removes_fields_out_of_projection():
+    async def _get_os_obj(c, obj_id, id_name=None):
+        return {"id": obj_id, "name": "f1", "links": []}
+
+    full = {"id": "id1", "name": "f0", "links": [], "vcpus": 1}
+    patch = patches.Patch()
+    with _mocks(get_os_obj=_get_os_obj):
+        await flavor.flavor_change_handler(
+            _body({"applied": True, "object": full}),
+            "f1",
+            "ns",
+            patch,
+            "update",
+        )
+
+    assert patch.status["object"] == {
+        "id": "id1",
+        "name": "f1",
+        "links": None,
+        "vcpus": None,
+    }
+    assert patch.status["fingerprint"] == utils.fingerprint(
+        {"id": "id1", "name": "f1"}
+    )
+
+
+@pytest.mark.asyncio
+async def test_change_handler_skips_observed_spec():
+    calls = []
+
+    async def _get_os_obj(c, obj_id, id_name=None):
+        calls.append(obj_id)
+        return {"id": obj_id}
+
+    status = {"applied": True, "object": {"id": "id1"}, **_observed()}
+    with _mocks(get_os_obj=_get_os_obj):
+        patch = patches.Patch()
+        await flavor.flavor_change_handler(
+            _body(status), "f1", "ns", patch, "update"
+        )
+        assert patch == {}
+        assert calls == []
+
+        with mock.patch.object(flavor.settings, "OPEN4K_RESYNC_INTERVAL", 0):
+            await flavor.flavor_change_handler(
+                _body(status), "f1", "ns", patch, "update"
+            )
+        assert calls == ["id1"]
+
+
+@pytest.mark.asyncio
+async def test_change_handler_stores_create_result():
+    async def _create_os_obj(c, body):
+        return {"id": "id1"}
+
+    patch = patches.Patch()
+    with _mocks(create_os_obj=_create_os_obj) as writer:
+        await flavor.flavor_change_handler(
+            _body(), "f1", "ns", patch, "create"
+        )
+
+    assert patch == {
+        "status": {
+            "applied": True,
+            "error": "",
+            "object": {"id": "id1"},
+            "fingerprint": utils.fingerprint({"id": "id1"}),
+            **_observed(),
+        }
+    }
+    writer.add.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_change_handler_writes_status_before_hook():
+    calls = []
+
+    async def _create_os_obj(c, body):
+        return {"id": "id1"}
+
+    async def _find(klass, name, namespace=None):
+        return "obj"
+
+    async def _write(obj, status):
+        calls.append(("write", obj, status["object"]))
+
+    async def _call(resource, hook_name, c, klass, obj, os_obj):
+        calls.append(("hook", obj, os_obj))
+        return {"object": {"id": "id2"}, "linked": True}
+
+    patch = patches.Patch()
+    with _mocks(create_os_obj=_create_os_obj) as writer, mock.patch.object(
+        flavor.hooks, "exists", return_value=True
+    ), mock.patch.object(flavor.hooks, "call", _call), mock.patch.object(
+        flavor.informer, "find", _find
+    ):
+        writer.write.side_effect = _write
+        await flavor.flavor_change_handler(
+            _body(), "f1", "ns", patch, "create"
+        )
+
+    assert calls == [
+        ("write", "obj", {"id": "id1"}),
+        ("hook", "obj", {"id": "id1"}),
+    ]
+    assert patch.status["object"] == {"id": "id2"}
+    assert patch.status["linked"] is True
+    writer.add.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_change_handler_stores_create_error():
+    async def _create_os_obj(c, body):
+        raise ValueError("boom")
+
+    patch = patches.Patch()
+    with _mocks(create_os_obj=_create_os_obj) as writer:
+        with pytest.raises(ValueError):
+            await flavor.flavor_change_handler(
+                _body(), "f1", "ns", patch, "create"
+            )
+
+    assert patch == {"status": {"applied": False, "error": "boom"}}
+    writer.add.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_change_handler_fetches_resumed_object_in_batch():
+    async def _get_os_obj(klass, c, cloud, obj_id):
+        return {"id": obj_id, "name": "f1"}
+
+    patch = patches.Patch()
+    with _mocks(), mock.patch.object(
+        flavor.resume, "get_os_obj", side_effect=_get_os_obj
+    ) as get_os_obj:
+        await flavor.flavor_change_handler(
+            _body({"applied": True, "object": {"id": "id1"}}),
+            "f1",
+            "ns",
+            patch,
+            "resume",
+        )
+
+    get_os_obj.assert_called_once_with(flavor.Flavor, "client", "c1", "id1")
+    assert patch.status["object"] == {"id": "id1", "name": "f1"}
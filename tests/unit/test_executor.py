@@ -0,0 +1,30 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from open4k import executor
+
+
+@pytest.mark.asyncio
+async def test_run_in_cloud_pool():
+    name = await executor.run(
+        lambda: threading.current_thread().name, cloud="test-cloud"
+    )
+    assert name.startswith("open4k-test-cloud")
+
+
+@pytest.mark.asyncio
+async def test_run_timeout_drops_queued_call():
+    calls = []
+    with mock.patch.dict(
+        executor.settings.OPEN4K_EXECUTOR_CLOUD_WORKERS, {"slow": 1}
+    ):
+        busy = executor.run(time.sleep, 0.2, cloud="slow")
+        queued = executor.run(calls.append, 1, cloud="slow", timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.gather(busy, queued)
+    await asyncio.sleep(0.3)
+    assert calls == []
@@ -0,0 +1,77 @@
+from unittest import mock
+
+import pytest
+
+from open4k import exception
+from open4k import hooks
+from open4k import images
+
+
+def _glance(methods, statuses):
+    requests = []
+
+    async def request(method, url, json=None, **kwargs):
+        requests.append((method, url, json))
+        if url.endswith("/info/import"):
+            return {"import-methods": {"value": methods}}
+
+    async def get_image(image_id):
+        return statuses.pop(0)
+
+    c = mock.Mock(endpoint="http://glance/v2")
+    c.request = request
+    c.images.get_image = get_image
+    return c, requests
+
+
+def _image(**spec):
+    obj = mock.Mock()
+    obj.obj = {"spec": {"cloud": "c1", "url": "http://src/img", **spec}}
+    return obj
+
+
+@pytest.mark.asyncio
+async def test_fill_image_by_web_download():
+    c, requests = _glance(
+        ["glance-direct", "web-download"],
+        [{"status": "importing"}, {"status": "active"}],
+    )
+    with mock.patch.object(
+        hooks.settings, "OPEN4K_IMAGE_IMPORT_POLL_INTERVAL", 0
+    ), mock.patch.object(images, "transfer") as transfer:
+        result = await hooks._fill_image(
+            c, _image(importMethod="web-download"), "i1"
+        )
+
+    assert result is None
+    transfer.assert_not_called()
+    assert requests[1] == (
+        "POST",
+        "http://glance/v2/images/i1/import",
+        {"method": {"name": "web-download", "uri": "http://src/img"}},
+    )
+
+
+@pytest.mark.asyncio
+async def test_fill_image_falls_back_to_upload():
+    c, requests = _glance(["glance-direct"], [])
+
+    async def transfer(*args):
+        transferred.append(args)
+
+    transferred = []
+    with mock.patch.object(images, "transfer", transfer):
+        await hooks._fill_image(c, _image(importMethod="web-download"), "i1")
+
+    assert transferred == [(c, "http://src/img", "i1", "c1", None)]
+    assert [r[0] for r in requests] == ["GET"]
+
+
+@pytest.mark.asyncio
+async def test_web_download_failed_import():
+    c, _ = _glance(
+        ["web-download"],
+        [{"status": "queued", "os_glance_failed_import": "web-download"}],
+    )
+    with pytest.raises(exception.ImageImportError):
+        await images.web_download(c, "http://src/img", "i1")
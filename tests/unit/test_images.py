@@ -0,0 +1,382 @@
+import asyncio
+import contextlib
+import hashlib
+import os
+import time
+from unittest import mock
+
+import pytest
+
+from open4k import exception
+from open4k import images
+
+validators = images.validators
+
+
+class FakeContent:
+    def __init__(self, data):
+        self.data = data
+
+    async def iter_chunked(self, size):
+        for i in range(0, len(self.data), size):
+            await asyncio.sleep(0)
+            yield self.data[i : i + size]
+
+
+class FakeResponse:
+    def __init__(self, status, data=b"", headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.content_length = len(data)
+        self.content = FakeContent(data)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise ValueError(self.status)
+
+
+class FakeSession:
+    """Serves data at any url, by ranges when range_status is 206."""
+
+    def __init__(self, data, range_status=206, headers=None):
+        self.data = data
+        self.range_status = range_status
+        self.headers = {"Accept-Ranges": "bytes"}
+        self.headers.update(headers or {})
+        self.ranges = []
+
+    def head(self, url, **kwargs):
+        return FakeResponse(200, self.data, self.headers)
+
+    def get(self, url, headers=None, **kwargs):
+        if not headers or "Range" not in headers:
+            return FakeResponse(200, self.data, self.headers)
+        start, end = map(int, headers["Range"][6:].split("-"))
+        self.ranges.append((start, end))
+        if self.range_status != 206:
+            return FakeResponse(self.range_status, self.data)
+        return FakeResponse(206, self.data[start : end + 1])
+
+
+@contextlib.contextmanager
+def _download_settings(session, streams=3):
+    with mock.patch.object(
+        images.aioclient, "get_session", return_value=session
+    ), mock.patch.multiple(
+        images.settings,
+        OPEN4K_IMAGE_DOWNLOAD_STREAMS=streams,
+        OPEN4K_IMAGE_RANGE_MIN_SIZE=10,
+        OPEN4K_IMAGE_CHUNK_SIZE=16,
+    ):
+        yield
+
+
+def _hashes(data):
+    return {
+        algo: hashlib.new(algo, data).hexdigest()
+        for algo in ("sha256", "sha512")
+    }
+
+
+def fake_download(calls):
+    async def download(url, path):
+        calls.append(url)
+        await asyncio.sleep(0)
+        data = url.encode() * 10 + str(len(calls)).encode()
+        with open(path, "wb") as f:
+            f.write(data)
+        return {"sha256": hashlib.sha256(data).hexdigest()}, len(data)
+
+    return download
+
+
+def fake_validators(current):
+    async def validators(url, known=None):
+        return dict(current)
+
+    return validators
+
+
+@pytest.fixture(autouse=True)
+def source_validators():
+    current = {"etag": "1"}
+    with mock.patch.object(images, "validators", fake_validators(current)):
+        yield current
+
+
+@pytest.mark.asyncio
+async def test_image_cache_single_download(tmp_path):
+    calls = []
+    cache = images.ImageCache(str(tmp_path), 1000)
+    with mock.patch.object(images, "download", fake_download(calls)):
+        e1, e2 = await asyncio.gather(cache.get("a"), cache.get("a"))
+        await cache.get("a")
+
+    assert calls == ["a"]
+    assert e1 is e2
+    assert os.path.exists(cache.data_path(e1["digest"]))
+    reloaded = images.ImageCache(str(tmp_path), 1000)
+    assert reloaded.index["a"]["digest"] == e1["digest"]
+
+
+@pytest.mark.asyncio
+async def test_image_cache_evicts_lru_not_read(tmp_path):
+    calls = []
+    cache = images.ImageCache(str(tmp_path), 25)
+    with mock.patch.object(images, "download", fake_download(calls)):
+        async with cache.open("a") as (path_a, _):
+            await cache.get("b")
+            await cache.get("c")
+            assert os.path.exists(path_a)
+            assert set(cache.index) == {"a", "c"}
+        await cache.get("d")
+
+    assert set(cache.index) == {"c", "d"}
+    assert not os.path.exists(path_a)
+
+
+@pytest.mark.asyncio
+async def test_download_by_ranges(tmp_path):
+    data = os.urandom(100)
+    session = FakeSession(data)
+    path = str(tmp_path / "image")
+    with _download_settings(session):
+        hashes, size = await images.download("url", path)
+
+    assert session.ranges == [(0, 33), (34, 67), (68, 99)]
+    assert (hashes, size) == (_hashes(data), 100)
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+@pytest.mark.asyncio
+async def test_download_falls_back_when_range_refused(tmp_path):
+    data = os.urandom(100)
+    session = FakeSession(data, range_status=200)
+    path = str(tmp_path / "image")
+    with _download_settings(session):
+        hashes, size = await images.download("url", path)
+
+    assert session.ranges
+    assert (hashes, size) == (_hashes(data), 100)
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+@pytest.mark.asyncio
+async def test_download_without_ranges_support(tmp_path):
+    data = os.urandom(100)
+    session = FakeSession(data, headers={"Accept-Ranges": "none"})
+    path = str(tmp_path / "image")
+    with _download_settings(session):
+        hashes, size = await images.download("url", path)
+
+    assert session.ranges == []
+    assert (hashes, size) == (_hashes(data), 100)
+
+
+@pytest.mark.asyncio
+async def test_download_ranges_waits_for_writes_before_close(tmp_path):
+    events = []
+    session = FakeSession(os.urandom(100))
+    get = session.get
+
+    def _get(url, headers=None, **kwargs):
+        if headers["Range"] == "bytes=50-99":
+            return FakeResponse(500)
+        return get(url, headers=headers, **kwargs)
+
+    def _pwrite(fd, chunk, offset):
+        time.sleep(0.05)
+        events.append("write")
+        return len(chunk)
+
+    def _close(fd):
+        events.append("close")
+        close(fd)
+
+    close = os.close
+    session.get = _get
+    with _download_settings(session, streams=2), mock.patch.object(
+        images.os, "pwrite", _pwrite
+    ), mock.patch.object(images.os, "close", _close):
+        with pytest.raises(exception.ImageDownloadError):
+            await images.download_ranges(
+                "url", str(tmp_path / "image"), 100, 2
+            )
+
+    assert events == ["write", "close"]
+
+
+@pytest.mark.asyncio
+async def test_image_cache_revalidates_source(tmp_path, source_validators):
+    calls = []
+    cache = images.ImageCache(str(tmp_path), 1000)
+    with mock.patch.object(images, "download", fake_download(calls)):
+        e1 = await cache.get("a")
+        source_validators["etag"] = "2"
+        assert await cache.get("a") is e1
+
+        with mock.patch.object(
+            images.settings, "OPEN4K_IMAGE_CACHE_REVALIDATE_INTERVAL", 0
+        ):
+            e2 = await cache.get("a")
+            assert await cache.get("a") is e2
+
+    assert calls == ["a", "a"]
+    assert e2["validators"] == {"etag": "2"}
+    assert os.path.exists(cache.data_path(e2["digest"]))
+    assert not os.path.exists(cache.data_path(e1["digest"]))
+
+
+@pytest.mark.asyncio
+async def test_validators_conditional_request():
+    session = FakeSession(b"data", headers={"ETag": "1"})
+    with _download_settings(session):
+        assert await validators("url") == {"etag": "1"}
+    session.head = lambda url, **kwargs: FakeResponse(304)
+    with _download_settings(session):
+        assert await validators("url", {"etag": "0"}) == {"etag": "0"}
+
+
+def test_parse_checksum():
+    assert images.parse_checksum("SHA256:AB") == ("sha256", "ab")
+    assert images.parse_checksum("cd") == ("sha512", "cd")
+
+
+@pytest.mark.asyncio
+async def test_find_image():
+    listed = []
+
+    async def list_images(**kwargs):
+        listed.append(kwargs)
+        return {
+            "images": [
+                {"id": "new", "status": "active", "os_hash_algo": "sha512"},
+                {"id": "q", "status": "queued", "os_hash_algo": "sha512"},
+                {"id": "old", "status": "active", "os_hash_algo": "sha512"},
+            ]
+        }
+
+    c = mock.Mock()
+    c.images.list = list_images
+    image = await images.find_image(c, "sha512", "ab", exclude="new")
+
+    assert image["id"] == "old"
+    assert listed == [{"os_hash_value": "ab"}]
+    assert await images.find_image(c, "sha256", "ab") is None
+
+
+def _glance(requests, existing=False):
+    async def request(method, url, data=None, **kwargs):
+        if data is not None:
+            data = b"".join([chunk async for chunk in data])
+        requests.append((method, url, data))
+
+    async def list_images(**filters):
+        return {"images": images_found}
+
+    images_found = [
+        {"id": "other", "status": "active", "os_hash_algo": "sha512"}
+    ] * existing
+    c = mock.Mock(endpoint="http://glance/v2/")
+    c.request = request
+    c.images.list = list_images
+    return c
+
+
+@pytest.mark.asyncio
+async def test_transfer_streams_source_to_glance():
+    data = os.urandom(100)
+    requests = []
+    with _download_settings(FakeSession(data)), mock.patch.object(
+        images, "get_cache", return_value=None
+    ):
+        await images.transfer(_glance(requests), "url", "i1", "c1")
+
+    assert requests == [("PUT", "http://glance/v2/images/i1/file", data)]
+
+
+@pytest.mark.asyncio
+async def test_transfer_checks_streamed_content():
+    data = os.urandom(100)
+    requests = []
+    with _download_settings(FakeSession(data)), mock.patch.object(
+        images, "get_cache", return_value=None
+    ):
+        with pytest.raises(exception.ImageDownloadError):
+            await images.transfer(
+                _glance(requests), "url", "i1", "c1", checksum="00"
+            )
+        digest = hashlib.sha512(data).hexdigest()
+        await images.transfer(_glance(requests), "url", "i1", "c1", digest)
+
+    assert requests == [("PUT", "http://glance/v2/images/i1/file", data)]
+
+
+@pytest.mark.asyncio
+async def test_transfer_returns_image_with_checksum():
+    requests = []
+    with mock.patch.object(images, "get_cache") as get_cache:
+        image = await images.transfer(
+            _glance(requests, existing=True), "url", "i1", "c1", "ab"
+        )
+
+    assert image["id"] == "other"
+    assert requests == []
+    get_cache.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_transfer_computes_missing_cached_hash(tmp_path):
+    requests = []
+    cache = images.ImageCache(str(tmp_path), 1000)
+    with mock.patch.object(
+        images, "download", fake_download([])
+    ), mock.patch.object(images, "get_cache", return_value=cache):
+        entry = await cache.get("a")
+        with open(cache.data_path(entry["digest"]), "rb") as f:
+            md5 = hashlib.md5(f.read()).hexdigest()
+        with pytest.raises(exception.ImageDownloadError):
+            await images.transfer(
+                _glance(requests), "a", "i1", "c1", checksum="md5:00"
+            )
+        assert entry["hashes"]["md5"] == md5
+        with pytest.raises(exception.ImageDownloadError):
+            await images.transfer(
+                _glance(requests), "a", "i1", "c1", checksum="nope:00"
+            )
+        await images.transfer(
+            _glance(requests), "a", "i1", "c1", checksum=f"md5:{md5}"
+        )
+
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_transfer_checks_cached_content(tmp_path):
+    requests = []
+    cache = images.ImageCache(str(tmp_path), 1000)
+    with mock.patch.object(
+        images, "download", fake_download([])
+    ), mock.patch.object(images, "get_cache", return_value=cache):
+        digest = (await cache.get("a"))["digest"]
+        with pytest.raises(exception.ImageDownloadError):
+            await images.transfer(
+                _glance(requests), "a", "i1", "c1", checksum="sha256:00"
+            )
+        assert requests == []
+
+        await images.transfer(
+            _glance(requests), "a", "i1", "c1", checksum=f"sha256:{digest}"
+        )
+
+    with open(cache.data_path(digest), "rb") as f:
+        data = f.read()
+    assert requests == [("PUT", "http://glance/v2/images/i1/file", data)]
@@ -0,0 +1,110 @@
+from unittest import mock
+
+import pytest
+
+from open4k import informer
+
+
+def _body(name, cloud="c1", os_id=None, namespace="ns"):
+    body = {
+        "kind": "Port",
+        "metadata": {"name": name, "namespace": namespace},
+        "spec": {"cloud": cloud},
+    }
+    if os_id:
+        body["status"] = {"object": {"id": os_id}}
+    return body
+
+
+def test_informer_indexes():
+    cache = informer.Informer()
+    cache.handle({"type": "ADDED", "object": _body("p1")})
+    cache.handle({"type": "MODIFIED", "object": _body("p1", os_id="id1")})
+    cache.handle({"type": None, "object": _body("p2", cloud="c2")})
+
+    assert cache.get("Port", "p1", "ns")["status"]["object"]["id"] == "id1"
+    assert cache.by_object_id("Port", "c1", "id1")["metadata"]["name"] == "p1"
+    assert cache.by_object_id("Port", "c2", "id1") is None
+    assert [b["metadata"]["name"] for b in cache.by_cloud("Port", "c2")] == [
+        "p2"
+    ]
+
+    cache.handle({"type": "MODIFIED", "object": _body("p1", cloud="c2")})
+    assert cache.by_object_id("Port", "c1", "id1") is None
+    assert len(cache.by_cloud("Port", "c2")) == 2
+
+    cache.handle({"type": "DELETED", "object": _body("p1", cloud="c2")})
+    assert cache.get("Port", "p1", "ns") is None
+    assert len(cache.by_cloud("Port", "c2")) == 1
+
+
+def test_informer_fill_keeps_watched_objects():
+    cache = informer.Informer()
+    cache.add(_body("p1", os_id="new"))
+    cache.fill("Port", [_body("p1", os_id="old"), _body("p2")])
+
+    assert "Port" in cache.synced
+    assert cache.get("Port", "p1", "ns")["status"]["object"]["id"] == "new"
+    assert cache.get("Port", "p2", "ns") is not None
+
+
+def test_informer_fill_skips_objects_changed_while_listing():
+    cache = informer.Informer()
+    cache.begin("Port")
+    cache.add(_body("p1"))
+    cache.handle({"type": "DELETED", "object": _body("p1")})
+    cache.fill("Port", [_body("p1"), _body("p2")])
+
+    assert cache.get("Port", "p1", "ns") is None
+    assert cache.get("Port", "p2", "ns") is not None
+    assert cache.listing == {}
+
+
+@mock.patch.object(informer, "CACHE", informer.Informer())
+def test_get_cached():
+    obj = mock.Mock(kind="Port", namespace="ns")
+    obj.name = "p1"
+    assert informer.get_cached(obj) is None
+    informer.CACHE.add(_body("p1"))
+    assert informer.get_cached(obj)["metadata"]["name"] == "p1"
+
+
+@pytest.mark.asyncio
+async def test_find_falls_back_to_api():
+    klass = mock.Mock(kind="Port")
+
+    async def _run(func, *args, **kwargs):
+        return "found"
+
+    with mock.patch.object(
+        informer, "CACHE", informer.Informer()
+    ), mock.patch.object(informer.executor, "run", side_effect=_run) as run:
+        informer.CACHE.add(_body("p1"))
+        assert await informer.find(klass, "p1", namespace="ns") is (
+            klass.return_value
+        )
+        run.assert_not_called()
+        assert await informer.find(klass, "p2", namespace="ns") == "found"
+
+
+@mock.patch.object(informer.kube, "api")
+def test_list_objects_by_pages(api):
+    pages = [
+        {"items": [_body("p1")], "metadata": {"continue": "t1"}},
+        {"items": [_body("p2")], "metadata": {}},
+    ]
+    api.get.return_value.json.side_effect = pages
+    klass = mock.Mock(kind="Port", endpoint="ports", version="v1")
+
+    with mock.patch.object(
+        informer.settings, "OPEN4K_LIST_PAGE_SIZE", 1
+    ), mock.patch.object(informer.settings, "OPEN4K_NAMESPACE", "ns"):
+        bodies = informer.list_objects(klass)
+
+    assert [b["metadata"]["name"] for b in bodies] == ["p1", "p2"]
+    assert api.get.call_args_list == [
+        mock.call(url="ports?limit=1", version="v1", namespace="ns"),
+        mock.call(
+            url="ports?limit=1&continue=t1", version="v1", namespace="ns"
+        ),
+    ]
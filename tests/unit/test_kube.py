@@ -1,4 +1,7 @@
+from unittest import mock
+
 import pykube
+import pytest
 
 from open4k import kube
 
@@ -7,3 +10,67 @@ def test_get_kubernetes_objects():
     kube_objects = kube.get_kubernetes_objects()
     assert kube_objects[("v1", "Secret")] == kube.Secret
     assert kube_objects[("v1", "Namespace")] == pykube.objects.Namespace
+
+
+@mock.patch.dict(kube.DISCOVERED_OBJECTS, clear=True)
+def test_object_factory_discovers_once():
+    api = mock.Mock()
+    api.get.return_value.json.return_value = {
+        "resources": [
+            {"name": "widgets", "kind": "Widget", "namespaced": True},
+            {"name": "widgets/status", "kind": "Widget", "namespaced": True},
+            {"name": "gadgets", "kind": "Gadget", "namespaced": False},
+        ]
+    }
+
+    widget = kube.object_factory(api, "example.com/v1", "Widget")
+    gadget = kube.object_factory(api, "example.com/v1", "Gadget")
+    assert kube.object_factory(api, "example.com/v1", "Widget") is widget
+    assert api.get.call_count == 1
+    assert widget.endpoint == "widgets"
+    assert issubclass(widget, pykube.objects.NamespacedAPIObject)
+    assert not issubclass(gadget, pykube.objects.NamespacedAPIObject)
+
+    with pytest.raises(ValueError):
+        kube.object_factory(api, "example.com/v1", "Unknown")
+    assert api.get.call_count == 2
+
+    secret = kube.object_factory(api, "v1", "Secret")
+    assert secret is kube.KUBE_OBJECTS[("v1", "Secret")]
+    assert api.get.call_count == 2
+
+
+def test_apply():
+    api = mock.Mock()
+    api.patch.return_value.json.return_value = {"metadata": {"name": "s1"}}
+    secret = pykube.Secret(
+        api,
+        {
+            "apiVersion": "v1",
+            "kind": "Secret",
+            "metadata": {"name": "s1", "namespace": "ns"},
+        },
+    )
+    kube.apply(secret, force=True)
+
+    kwargs = api.patch.call_args[1]
+    assert kwargs["url"] == "/secrets/s1?fieldManager=open4k&force=true"
+    assert kwargs["namespace"] == "ns"
+    assert kwargs["headers"] == {
+        "Content-Type": "application/apply-patch+yaml"
+    }
+    api.raise_for_status.assert_called_once_with(api.patch.return_value)
+    assert secret.obj == {"metadata": {"name": "s1"}}
+
+
+@mock.patch.object(kube, "apply")
+def test_save_secret_data(apply):
+    kube.save_secret_data("ns", "s1", {"k": "dg=="}, labels={"a": "b"})
+    secret = apply.call_args[0][0]
+    assert secret.obj == {
+        "apiVersion": "v1",
+        "kind": "Secret",
+        "metadata": {"name": "s1", "namespace": "ns", "labels": {"a": "b"}},
+        "data": {"k": "dg=="},
+    }
+    assert apply.call_args[1] == {"force": True}
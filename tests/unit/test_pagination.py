@@ -0,0 +1,107 @@
+from unittest import mock
+
+import pytest
+
+from open4k import client
+from open4k import pagination
+
+
+def _pages(pages):
+    calls = []
+
+    def func(**kwargs):
+        calls.append(kwargs)
+        return pages.pop(0)
+
+    return func, calls
+
+
+def test_next_marker():
+    assert pagination.next_marker({"ports": []}, "ports") is None
+    assert (
+        pagination.next_marker(
+            {
+                "servers_links": [
+                    {"rel": "next", "href": "http://n/servers?marker=s2"}
+                ]
+            },
+            "servers",
+        )
+        == "s2"
+    )
+    assert (
+        pagination.next_marker(
+            {"next": "/v2/images?limit=2&marker=i2"}, "images"
+        )
+        == "i2"
+    )
+
+
+@mock.patch.object(pagination.settings, "OPEN4K_LIST_PAGE_SIZE", 2)
+def test_paginate_follows_next_links():
+    func, calls = _pages(
+        [
+            {
+                "ports": [{"id": "p1"}, {"id": "p2"}],
+                "ports_links": [{"rel": "next", "href": "/ports?marker=p2"}],
+            },
+            {"ports": [{"id": "p3"}]},
+        ]
+    )
+
+    ports = pagination.paginate(func, "ports", device_id="d1")
+    assert [p["id"] for p in ports] == ["p1", "p2", "p3"]
+    assert calls == [
+        {"device_id": "d1", "limit": 2},
+        {"device_id": "d1", "limit": 2, "marker": "p2"},
+    ]
+
+
+@mock.patch.object(pagination.settings, "OPEN4K_LIST_PAGE_SIZE", 2)
+def test_paginate_caps_total_by_limit():
+    func, calls = _pages(
+        [
+            {
+                "flavors": [{"id": "f1"}, {"id": "f2"}],
+                "flavors_links": [{"rel": "next", "href": "/f?marker=f2"}],
+            },
+            {
+                "flavors": [{"id": "f3"}],
+                "flavors_links": [{"rel": "next", "href": "/f?marker=f3"}],
+            },
+        ]
+    )
+
+    flavors = pagination.paginate(func, "flavors", limit=3, sort_key="vcpus")
+    assert [f["id"] for f in flavors] == ["f1", "f2", "f3"]
+    assert calls == [
+        {"sort_key": "vcpus", "limit": 2},
+        {"sort_key": "vcpus", "limit": 1, "marker": "f2"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_apaginate_follows_next_links():
+    pages = [
+        {"images": [{"id": "i1"}], "next": "/v2/images?marker=i1"},
+        {"images": [{"id": "i2"}]},
+    ]
+
+    async def func(**kwargs):
+        return pages.pop(0)
+
+    images = [i["id"] async for i in pagination.apaginate(func, "images")]
+    assert images == ["i1", "i2"]
+
+
+def test_schema_has_page_params():
+    params = client.get_schema("network")["paths"]["/ports"]["get"][
+        "parameters"
+    ]
+    names = [p["name"] for p in params]
+    assert "limit" in names
+    assert "marker" in names
+    flavors = client.get_schema("compute")["paths"]["/flavors/detail"]
+    assert [p["name"] for p in flavors["get"]["parameters"]].count(
+        "limit"
+    ) == 1
@@ -0,0 +1,81 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from open4k import poller
+
+
+class FakeServers:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    async def list_servers(self, **kwargs):
+        self.calls.append(kwargs)
+        response = self.responses.pop(0)
+        if isinstance(response, dict):
+            return response
+        return {"servers": response}
+
+
+@pytest.mark.asyncio
+async def test_poller_batches_servers():
+    c = mock.Mock()
+    c.servers = FakeServers(
+        [
+            [{"id": "s1", "status": "BUILD"}],
+            [
+                {"id": "s1", "status": "ACTIVE"},
+                {"id": "s2", "status": "ERROR"},
+                {"id": "other", "status": "ACTIVE"},
+            ],
+        ]
+    )
+
+    async def get_async_client(*args):
+        return c
+
+    p = poller.ReadinessPoller("ns", "cloud")
+    with mock.patch.object(
+        poller.client, "get_async_client", get_async_client
+    ), mock.patch.object(poller.settings, "OPEN4K_POLLER_MIN_INTERVAL", 0):
+        s1, s2 = await asyncio.gather(p.wait("s1"), p.wait("s2"))
+
+    assert s1["status"] == "ACTIVE"
+    assert s2["status"] == "ERROR"
+    assert len(c.servers.calls) == 2
+    assert "changes-since" in c.servers.calls[0]
+    assert p.waiting == {}
+
+
+@pytest.mark.asyncio
+async def test_poller_reads_all_pages():
+    c = mock.Mock()
+    c.servers = FakeServers(
+        [
+            {
+                "servers": [{"id": "other", "status": "ACTIVE"}],
+                "servers_links": [
+                    {"rel": "next", "href": "/servers?marker=other"}
+                ],
+            },
+            [{"id": "s1", "status": "ACTIVE"}],
+        ]
+    )
+
+    async def get_async_client(*args):
+        return c
+
+    p = poller.ReadinessPoller("ns", "cloud")
+    with mock.patch.object(
+        poller.client, "get_async_client", get_async_client
+    ), mock.patch.object(poller.settings, "OPEN4K_POLLER_MIN_INTERVAL", 0):
+        s1 = await p.wait("s1")
+
+    assert s1["status"] == "ACTIVE"
+    assert c.servers.calls[1]["marker"] == "other"
+    assert (
+        c.servers.calls[1]["changes-since"]
+        == c.servers.calls[0]["changes-since"]
+    )
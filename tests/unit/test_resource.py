@@ -0,0 +1,247 @@
+import io
+import json
+from unittest import mock
+
+import pytest
+import yaml
+
+from open4k import informer
+from open4k import resource
+from open4k.controllers import port
+
+
+def _client(ports):
+    cl = mock.Mock()
+    cl.ports.list_ports.return_value = {"ports": ports}
+    return cl
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    with mock.patch.object(
+        resource.informer, "CACHE", informer.Informer()
+    ), mock.patch.object(
+        resource.informer, "list_objects", return_value=[]
+    ) as list_objects:
+        yield list_objects
+
+
+def test_checkpoint(tmp_path):
+    path = str(tmp_path / "checkpoint")
+    checkpoint = resource.Checkpoint(path)
+    checkpoint.add("c1", "Port", "id1")
+    checkpoint.add("c1", "Port", "*")
+    checkpoint.close()
+
+    checkpoint = resource.Checkpoint(path)
+    assert ("c1", "Port", "id1") in checkpoint
+    assert ("c1", "Port", "*") in checkpoint
+    assert ("c1", "Port", "id2") not in checkpoint
+
+
+@mock.patch.object(resource.client, "get_client")
+def test_importer_resumes_from_checkpoint(get_client, tmp_path):
+    get_client.return_value = _client(
+        [{"id": "id1"}, {"id": "id2"}, {"id": "id3"}]
+    )
+    checkpoint = resource.Checkpoint(str(tmp_path / "checkpoint"))
+    checkpoint.add("c1", "Port", "id1")
+    importer = resource.Importer(2, checkpoint=checkpoint)
+    imported = []
+    failing = {"id3"}
+
+    def import_object(cloud, klass, os_obj):
+        if os_obj["id"] in failing:
+            raise ValueError("boom")
+        imported.append(os_obj["id"])
+
+    with mock.patch.object(importer, "import_object", import_object):
+        assert importer.import_resources("c1", "port") == 1
+        assert imported == ["id2"]
+        assert ("c1", "Port", "id2") in checkpoint
+        assert ("c1", "Port", "*") not in checkpoint
+
+        imported.clear()
+        failing.clear()
+        assert importer.import_resources("c1", "port") == 0
+        assert imported == ["id3"]
+        assert ("c1", "Port", "*") in checkpoint
+
+        imported.clear()
+        assert importer.import_resources("c1", "port") == 0
+        assert imported == []
+    importer.close()
+
+
+@mock.patch.object(resource.writer, "WRITER")
+@mock.patch.object(resource.kube, "apply")
+@mock.patch.object(resource.informer, "get_cached")
+def test_import_object(get_cached, apply, writer):
+    importer = resource.Importer(1)
+    os_obj = {"id": "id1", "name": "p1", "links": []}
+    status = port.Port.object_status(os_obj)
+    get_cached.return_value = None
+    importer.import_object("c1", port.Port, os_obj)
+
+    obj = apply.call_args[0][0]
+    assert obj.name == "c1-p1"
+    assert obj.obj["spec"] == {"managed": False, "cloud": "c1"}
+    assert apply.call_args[1] == {"field_manager": "open4k-import"}
+    writer.submit.assert_called_once_with(obj, {"applied": True, **status})
+
+    apply.reset_mock()
+    writer.reset_mock()
+    get_cached.return_value = {"status": status}
+    importer.import_object("c1", port.Port, os_obj)
+    apply.assert_not_called()
+    writer.submit.assert_not_called()
+    importer.close()
+
+
+@mock.patch.object(resource.writer, "WRITER")
+@mock.patch.object(resource.kube, "apply")
+@mock.patch.object(resource.client, "get_client")
+def test_importer_lists_existing_objects_once(
+    get_client, apply, writer, cache
+):
+    os_obj = {"id": "id1", "name": "p1"}
+    get_client.return_value = _client([os_obj])
+    cache.return_value = [
+        {
+            "kind": "Port",
+            "metadata": {"name": "c1-p1", "namespace": "openstack"},
+            "spec": {"managed": False, "cloud": "c1"},
+            "status": port.Port.object_status(os_obj),
+        }
+    ]
+    importer = resource.Importer(1)
+    with mock.patch.object(resource.settings, "OPEN4K_NAMESPACE", "openstack"):
+        assert importer.import_resources("c1", "port") == 0
+        assert importer.import_resources("c1", "port") == 0
+    importer.close()
+
+    cache.assert_called_once_with(port.Port)
+    apply.assert_not_called()
+    writer.submit.assert_not_called()
+
+
+@mock.patch.object(resource.client, "get_client")
+def test_importer_exports_manifests(get_client):
+    get_client.return_value = _client([{"id": "id1", "name": "p_1"}])
+    stream = io.StringIO()
+    importer = resource.Importer(
+        1, exporter=resource.Exporter(stream, "jsonl")
+    )
+    with mock.patch.object(resource.kube, "apply") as apply:
+        assert importer.import_resources("c1", "port") == 0
+    importer.close()
+
+    apply.assert_not_called()
+    data = json.loads(stream.getvalue())
+    assert data["metadata"]["name"] == "c1-p-1"
+    assert data["spec"] == {"managed": False, "cloud": "c1"}
+    assert data["status"]["applied"] is True
+    assert data["status"]["object"] == {"id": "id1", "name": "p_1"}
+    assert ("c1", "Port", "*") not in importer.checkpoint
+
+
+def test_exporter_yaml():
+    stream = io.StringIO()
+    exporter = resource.Exporter(stream, "yaml")
+    exporter.write({"kind": "Port"})
+    exporter.write({"kind": "Image"})
+    docs = list(yaml.safe_load_all(stream.getvalue()))
+    assert docs == [{"kind": "Port"}, {"kind": "Image"}]
+
+
+def test_read_manifests():
+    for fmt in resource.Exporter.FORMATS:
+        stream = io.StringIO()
+        exporter = resource.Exporter(stream, fmt)
+        exporter.write({"kind": "Port"})
+        exporter.write({"kind": "Image"})
+        stream.seek(0)
+        assert list(resource.read_manifests(stream)) == [
+            {"kind": "Port"},
+            {"kind": "Image"},
+        ]
+
+
+def test_read_manifests_reads_stream_by_parts():
+    stream = mock.Mock(
+        wraps=io.StringIO("\n---\nkind: Port\n---\nkind: Image\n")
+    )
+    docs = resource.read_manifests(stream)
+    assert next(docs) == {"kind": "Port"}
+    assert list(docs) == [{"kind": "Image"}]
+    assert stream.read.call_args_list
+    assert all(call[0][0] > 0 for call in stream.read.call_args_list)
+
+    stream = io.StringIO('{"kind": "Port"}\n\n{"kind": "Image"}\n')
+    assert list(resource.read_manifests(stream)) == [
+        {"kind": "Port"},
+        {"kind": "Image"},
+    ]
+
+
+@mock.patch.object(resource.writer, "WRITER")
+@mock.patch.object(resource.kube, "apply")
+def test_load_writes_status_separately(apply, writer):
+    status = {"applied": True, "object": {"id": "id1"}}
+    data = resource.manifest("c1", port.Port, {"id": "id1", "name": "p1"})
+    resource.load({**data, "status": status})
+
+    obj = apply.call_args[0][0]
+    assert obj.obj == data
+    assert apply.call_args[1] == {"field_manager": "open4k-import"}
+    writer.submit.assert_called_once_with(obj, status)
+
+
+def test_shard_of():
+    shards = [resource.shard_of("c1", "Port", str(i), 4) for i in range(100)]
+    assert set(shards) == {0, 1, 2, 3}
+    assert shards == [
+        resource.shard_of("c1", "Port", str(i), 4) for i in range(100)
+    ]
+
+
+@mock.patch.object(resource.client, "get_client")
+def test_importer_imports_own_shard(get_client):
+    ports = [{"id": str(i)} for i in range(20)]
+    get_client.return_value = _client(ports)
+    imported = []
+    for index in range(3):
+        importer = resource.Importer(2, shard_index=index, shard_count=3)
+        with mock.patch.object(
+            importer,
+            "import_object",
+            lambda cloud, klass, os_obj: imported.append(
+                (index, os_obj["id"])
+            ),
+        ):
+            importer.import_resources("c1", "port")
+        importer.close()
+
+    assert sorted(i for _, i in imported) == sorted(p["id"] for p in ports)
+    for index, os_id in imported:
+        assert resource.shard_of("c1", "Port", os_id, 3) == index
+
+
+@mock.patch.object(resource, "Importer")
+@mock.patch.object(resource, "import_object")
+@mock.patch.object(resource.client, "get_client")
+def test_import_resources_without_importer(
+    get_client, import_object, importer
+):
+    get_client.return_value = _client([{"id": "id1"}, {"id": "id2"}])
+    import_object.side_effect = [None, ValueError("boom")]
+
+    assert resource.import_resources("c1", "port", {"device_id": "d1"}) == 1
+
+    importer.assert_not_called()
+    assert [c[0][2]["id"] for c in import_object.call_args_list] == [
+        "id1",
+        "id2",
+    ]
+    cl = get_client.return_value
+    assert cl.ports.list_ports.call_args[1]["device_id"] == "d1"
@@ -0,0 +1,116 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from open4k import exception
+from open4k import resume
+
+
+class FakeKind:
+    kind = "Port"
+
+    def __init__(self, listed, api=None):
+        self.listed = listed
+        self.api = api or {}
+        self.list_calls = []
+        self.get_calls = []
+
+    async def list_os_objs(self, c, **filters):
+        self.list_calls.append(filters)
+        if "id" in filters:
+            return [o for o in self.listed if o["id"] in filters["id"]]
+        return self.listed[: filters.get("limit")]
+
+    async def get_os_obj(self, c, obj_id):
+        self.get_calls.append(obj_id)
+        if obj_id == "gone":
+            raise exception.OpenStackApiError(404, "not found")
+        return {"id": obj_id, "got": True}
+
+
+async def _get_all(batch, ids):
+    return await asyncio.gather(
+        *[batch.get("c", i) for i in ids], return_exceptions=True
+    )
+
+
+@pytest.mark.asyncio
+async def test_resume_batch_lists_objects_by_ids():
+    klass = FakeKind(
+        [{"id": "p1"}, {"id": "p2"}, {"id": "other"}], {"ids_filter": "id"}
+    )
+    batch = resume.ResumeBatch(klass, "cloud")
+    with mock.patch.object(
+        resume.settings, "OPEN4K_RESUME_BATCH_DELAY", 0
+    ), mock.patch.object(resume, "IDS_PER_LIST", 3):
+        p1, p2, p3, gone = await _get_all(batch, ["p1", "p2", "p3", "gone"])
+
+    assert p1 == {"id": "p1"}
+    assert p2 == {"id": "p2"}
+    assert p3 == {"id": "p3", "got": True}
+    assert isinstance(gone, exception.OpenStackApiError)
+    assert klass.list_calls == [{"id": ["p1", "p2", "p3"]}, {"id": ["gone"]}]
+    assert klass.get_calls == ["p3", "gone"]
+
+
+@pytest.mark.asyncio
+async def test_resume_batch_formats_ids_filter():
+    klass = FakeKind([], {"ids_filter": "id", "ids_filter_format": "in:%s"})
+    batch = resume.ResumeBatch(klass, "cloud")
+    with mock.patch.object(resume.settings, "OPEN4K_RESUME_BATCH_DELAY", 0):
+        await _get_all(batch, ["i1", "i2"])
+
+    assert klass.list_calls == [{"id": "in:i1,i2"}]
+
+
+@pytest.mark.asyncio
+async def test_resume_batch_lists_pages_by_requests():
+    klass = FakeKind([{"id": f"p{i}"} for i in range(10)])
+    batch = resume.ResumeBatch(klass, "cloud")
+    with mock.patch.object(
+        resume.settings, "OPEN4K_RESUME_BATCH_DELAY", 0
+    ), mock.patch.object(resume.settings, "OPEN4K_LIST_PAGE_SIZE", 2):
+        p0, p4, p9, p11 = await _get_all(batch, ["p0", "p4", "p9", "p11"])
+
+    assert klass.list_calls == [{"limit": 4}]
+    assert p0 == {"id": "p0"}
+    assert p9 == {"id": "p9", "got": True}
+    assert klass.get_calls == ["p4", "p9", "p11"]
+
+
+@pytest.mark.asyncio
+async def test_resume_batch_gets_single_object():
+    klass = FakeKind([{"id": "p1"}], {"ids_filter": "id"})
+    batch = resume.ResumeBatch(klass, "cloud")
+    with mock.patch.object(resume.settings, "OPEN4K_RESUME_BATCH_DELAY", 0):
+        (p1,) = await _get_all(batch, ["p1"])
+
+    assert p1 == {"id": "p1", "got": True}
+    assert klass.list_calls == []
+
+
+@pytest.mark.asyncio
+async def test_resume_batch_serves_requests_during_fetch():
+    klass = FakeKind([{"id": "p1"}], {"ids_filter": "id"})
+    listing = asyncio.Event()
+    release = asyncio.Event()
+    list_os_objs = klass.list_os_objs
+
+    async def _list_os_objs(c, **filters):
+        listing.set()
+        await release.wait()
+        return await list_os_objs(c, **filters)
+
+    klass.list_os_objs = _list_os_objs
+    batch = resume.ResumeBatch(klass, "cloud")
+    with mock.patch.object(resume.settings, "OPEN4K_RESUME_BATCH_DELAY", 0):
+        first = asyncio.ensure_future(_get_all(batch, ["p1", "p3"]))
+        await listing.wait()
+        late = asyncio.ensure_future(batch.get("c", "p2"))
+        await asyncio.sleep(0)
+        release.set()
+        (p1, p3), p2 = await asyncio.wait_for(asyncio.gather(first, late), 1)
+
+    assert p1 == {"id": "p1"}
+    assert p2 == {"id": "p2", "got": True}
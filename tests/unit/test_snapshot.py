@@ -0,0 +1,91 @@
+import sqlite3
+import time
+from unittest import mock
+
+import pytest
+
+from open4k import snapshot
+
+
+class FakeKind:
+    kind = "Port"
+    api = {"changes_since": "changed_since"}
+
+
+def _body(fingerprint, generation=1):
+    return {
+        "metadata": {
+            "name": "p1",
+            "namespace": "ns",
+            "generation": generation,
+        },
+        "spec": {"cloud": "c1"},
+        "status": {"object": {"id": "id1"}, "fingerprint": fingerprint},
+    }
+
+
+def test_snapshot_persists_state(tmp_path):
+    path = str(tmp_path / "snapshot.db")
+    s = snapshot.Snapshot(path)
+    s.put_object("Port", "ns", "p1", "f1", 100)
+    s.put_object("Port", "ns", "p2", "f2", 100)
+    s.put_object("Port", "ns", "p1", "f3", 200)
+    s.delete_object("Port", "ns", "p2")
+    s.put_mark("c1", "Port", 300)
+    s.close()
+
+    s = snapshot.Snapshot(path)
+    assert s.get_object("Port", "ns", "p1") == ("f3", 200, None)
+    assert s.get_object("Port", "ns", "p2") is None
+    assert s.marks == {("c1", "Port"): 300}
+
+
+def test_snapshot_adds_generation_column(tmp_path):
+    path = str(tmp_path / "snapshot.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE objects (kind TEXT, namespace TEXT, name TEXT, "
+        "fingerprint TEXT, synced_at REAL)"
+    )
+    db.execute("INSERT INTO objects VALUES ('Port', 'ns', 'p1', 'f1', 100)")
+    db.commit()
+    db.close()
+
+    s = snapshot.Snapshot(path)
+    assert s.get_object("Port", "ns", "p1") == ("f1", 100, None)
+
+
+@pytest.mark.asyncio
+async def test_is_fresh(tmp_path):
+    s = snapshot.Snapshot(str(tmp_path / "snapshot.db"))
+    with mock.patch.object(snapshot, "SNAPSHOT", s), mock.patch.object(
+        snapshot.settings, "OPEN4K_SYNC_INTERVAL", 60
+    ), mock.patch.object(
+        snapshot.settings, "OPEN4K_SNAPSHOT_MAX_AGE", 3600
+    ), mock.patch.dict(
+        snapshot.EXISTING, {("c1", "Port"): {"id1"}}
+    ):
+        await snapshot.remember("Port", _body("f1"), "f1")
+        assert not snapshot.is_fresh(FakeKind, _body("f1"))
+
+        s.put_mark("c1", "Port", time.time())
+        assert snapshot.is_fresh(FakeKind, _body("f1"))
+        assert not snapshot.is_fresh(FakeKind, _body("f2"))
+        assert not snapshot.is_fresh(FakeKind, _body("f1", generation=2))
+
+        snapshot.EXISTING[("c1", "Port")] = set()
+        assert not snapshot.is_fresh(FakeKind, _body("f1"))
+        snapshot.EXISTING[("c1", "Port")] = {"id1"}
+
+        s.put_object("Port", "ns", "p1", "f1", time.time() - 7200, 1)
+        assert not snapshot.is_fresh(FakeKind, _body("f1"))
+
+        await snapshot.forget("Port", "ns", "p1")
+        assert s.get_object("Port", "ns", "p1") is None
+
+
+def test_is_fresh_without_snapshot():
+    with mock.patch.object(snapshot, "SNAPSHOT", None), mock.patch.object(
+        snapshot.settings, "OPEN4K_SNAPSHOT_PATH", ""
+    ):
+        assert not snapshot.is_fresh(FakeKind, _body("f1"))
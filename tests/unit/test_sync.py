@@ -0,0 +1,99 @@
+from unittest import mock
+
+import pytest
+
+from open4k import informer
+from open4k import snapshot
+from open4k import sync
+from open4k import utils
+from open4k.controllers import image
+from open4k.controllers import port
+
+
+def _body(name, os_obj):
+    return {
+        "kind": "Port",
+        "metadata": {"name": name, "namespace": "ns"},
+        "spec": {"cloud": "c1"},
+        "status": {
+            "object": os_obj,
+            "fingerprint": utils.fingerprint(os_obj),
+        },
+    }
+
+
+def test_changes_filter():
+    assert sync.changes_filter(port.Port, 0) == {
+        "changed_since": "1970-01-01T00:00:00Z"
+    }
+    assert sync.changes_filter(image.Image, 0) == {
+        "updated_at": "gte:1970-01-01T00:00:00Z"
+    }
+
+
+@pytest.mark.asyncio
+async def test_sync_updates_changed_objects():
+    cache = informer.Informer()
+    cache.add(_body("p1", {"id": "id1", "status": "DOWN"}))
+    cache.add(_body("p2", {"id": "id2", "status": "ACTIVE"}))
+    listed = [
+        {"id": "id1", "status": "ACTIVE"},
+        {"id": "id2", "status": "ACTIVE"},
+        {"id": "unknown", "status": "ACTIVE"},
+    ]
+    calls = []
+
+    async def _get_client(*args):
+        return "client"
+
+    async def _list_os_objs(c, **filters):
+        calls.append(filters)
+        return listed
+
+    with mock.patch.object(informer, "CACHE", cache), mock.patch.object(
+        sync.client, "get_async_client", _get_client
+    ), mock.patch.object(
+        port.Port, "list_os_objs", _list_os_objs
+    ), mock.patch.object(
+        sync.writer, "WRITER"
+    ) as writer, mock.patch.dict(
+        sync.MARKS, {("c1", "Port"): 1000}
+    ), mock.patch.object(
+        sync.settings, "OPEN4K_POLLER_CHANGES_SINCE_MARGIN", 60
+    ):
+        assert await sync.sync(port.Port, "c1") == 1
+        assert sync.MARKS[("c1", "Port")] > 1000
+
+    assert calls == [{"changed_since": utils.isotime(940)}]
+    writer.add.assert_called_once()
+    obj, status = writer.add.call_args[0]
+    assert obj.name == "p1"
+    assert status["object"]["status"] == "ACTIVE"
+
+
+@pytest.mark.asyncio
+async def test_revalidate_lists_marked_kinds(tmp_path):
+    store = snapshot.Snapshot(str(tmp_path / "snapshot.db"))
+    store.put_mark("c1", "Port", 1000)
+    store.put_mark("c2", "Port", 1000)
+
+    async def _get_client(ns, cloud, service):
+        return cloud
+
+    async def _list_os_objs(c, **filters):
+        assert filters == {"fields": "id"}
+        if c == "c2":
+            raise ValueError("boom")
+        return [{"id": "id1"}, {"id": "id2"}]
+
+    with mock.patch.object(
+        sync.client, "get_async_client", _get_client
+    ), mock.patch.object(
+        port.Port, "list_os_objs", _list_os_objs
+    ), mock.patch.dict(
+        snapshot.EXISTING, clear=True
+    ):
+        await sync.revalidate(store)
+        assert snapshot.EXISTING == {("c1", "Port"): {"id1", "id2"}}
+
+    assert store.marks == {("c1", "Port"): 1000}
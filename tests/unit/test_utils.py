@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from unittest import mock
+
 from open4k import utils
 
 
@@ -22,3 +24,35 @@ def test_divide_into_groups_of():
     )
     assert [] == utils.divide_into_groups_of(2, [])
     assert [["a"]] == utils.divide_into_groups_of(5, ["a"])
+
+
+def test_project():
+    obj = {"id": "1", "name": "a", "links": []}
+    assert {"id": "1"} == utils.project(obj, ["id", "status"])
+    assert obj is utils.project(obj, [])
+    with mock.patch.object(utils.settings, "OPEN4K_STATUS_FULL_OBJECT", True):
+        assert obj is utils.project(obj, ["id"])
+
+
+def test_replacement():
+    current = {"id": "1", "links": [], "a": {"b": 1, "c": 2}}
+    patch = utils.replacement(current, {"id": "1", "a": {"c": 3}})
+    assert patch == {"id": "1", "links": None, "a": {"b": None, "c": 3}}
+    assert utils.replacement(None, {"id": "1"}) == {"id": "1"}
+
+
+def test_fingerprint():
+    assert utils.fingerprint({"a": 1, "b": [1, 2]}) == utils.fingerprint(
+        {"b": [1, 2], "a": 1}
+    )
+    assert utils.fingerprint({"a": 1}) != utils.fingerprint({"a": 2})
+
+
+def test_is_observed():
+    body = {"metadata": {"generation": 2}, "spec": {"cloud": "c1"}}
+    assert not utils.is_observed(body, 60)
+    body["status"] = utils.observed_status(body)
+    assert utils.is_observed(body, 60)
+    assert not utils.is_observed(body, -60)
+    body["spec"]["managed"] = False
+    assert not utils.is_observed(body, 60)
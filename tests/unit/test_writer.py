@@ -0,0 +1,139 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from open4k import writer
+
+
+def _obj(name):
+    obj = mock.Mock(kind="Port", namespace="ns")
+    obj.name = name
+    return obj
+
+
+def test_merge():
+    dst = {"object": {"id": "1", "status": "BUILD"}, "applied": True}
+    writer.merge(dst, {"object": {"status": "ACTIVE"}, "error": ""})
+    assert dst == {
+        "object": {"id": "1", "status": "ACTIVE"},
+        "applied": True,
+        "error": "",
+    }
+
+
+@pytest.mark.asyncio
+async def test_writer_coalesces_updates():
+    calls = []
+
+    async def _run(func, patch, subresource=None):
+        calls.append((func, patch))
+
+    w = writer.StatusWriter(0.01)
+    p1, p2 = _obj("p1"), _obj("p2")
+    with mock.patch.object(writer.executor, "run", _run):
+        w.add(p1, {"applied": True, "object": {"status": "BUILD"}})
+        w.add(p2, {"applied": True})
+        w.add(p1, {"object": {"status": "ACTIVE"}})
+        await asyncio.gather(*w.tasks.values())
+        w.add(p1, {"error": "boom"})
+        await asyncio.gather(*w.tasks.values())
+
+    assert calls == [
+        (
+            p1.patch,
+            {"status": {"applied": True, "object": {"status": "ACTIVE"}}},
+        ),
+        (p2.patch, {"status": {"applied": True}}),
+        (p1.patch, {"status": {"error": "boom"}}),
+    ]
+    assert w.tasks == {}
+
+
+@pytest.mark.asyncio
+async def test_writer_flush():
+    w = writer.StatusWriter(60)
+    p1 = _obj("p1")
+    w.add(p1, {"applied": True})
+    w.add(p1, {"error": ""})
+    await w.flush()
+    await asyncio.sleep(0)
+
+    p1.patch.assert_called_once_with(
+        {"status": {"applied": True, "error": ""}}, subresource="status"
+    )
+    assert w.pending == {}
+    assert w.tasks == {}
+
+
+def test_writer_submit_without_loop():
+    w = writer.StatusWriter(60)
+    p1 = _obj("p1")
+    w.submit(p1, {"applied": True})
+    p1.patch.assert_called_once_with(
+        {"status": {"applied": True}}, subresource="status"
+    )
+
+
+@pytest.mark.asyncio
+async def test_writer_write_after_pending_updates():
+    calls = []
+
+    async def _run(func, patch, subresource=None):
+        calls.append(patch)
+
+    w = writer.StatusWriter(0.01)
+    p1 = _obj("p1")
+    with mock.patch.object(writer.executor, "run", _run):
+        w.add(p1, {"object": {"status": "BUILD"}})
+        await w.write(p1, {"applied": True, "object": {"id": "1"}})
+        await asyncio.gather(*w.tasks.values())
+
+    assert calls == [
+        {
+            "status": {
+                "applied": True,
+                "object": {"status": "BUILD", "id": "1"},
+            }
+        }
+    ]
+    assert w.tasks == {}
+
+
+@pytest.mark.asyncio
+async def test_writer_write_raises():
+    async def _run(func, patch, subresource=None):
+        raise ValueError("boom")
+
+    w = writer.StatusWriter(0.01)
+    with mock.patch.object(writer.executor, "run", _run):
+        with pytest.raises(ValueError):
+            await w.write(_obj("p1"), {"applied": True})
+
+
+@pytest.mark.asyncio
+async def test_writer_flush_waits_for_writes_in_flight():
+    calls = []
+    started = asyncio.Event()
+
+    async def _run(func, patch, subresource=None):
+        started.set()
+        await asyncio.sleep(0.05)
+        calls.append(patch["status"])
+
+    w = writer.StatusWriter(0)
+    p1 = _obj("p1")
+    p1.patch.side_effect = lambda patch, subresource: calls.append(
+        patch["status"]
+    )
+    with mock.patch.object(writer.executor, "run", _run):
+        w.add(p1, {"object": {"status": "BUILD"}})
+        await started.wait()
+        w.add(p1, {"object": {"status": "ACTIVE"}})
+        await w.flush()
+
+    assert calls == [
+        {"object": {"status": "BUILD"}},
+        {"object": {"status": "ACTIVE"}},
+    ]
+    assert w.writes == set()